@@ -0,0 +1,36 @@
+""" Microbenchmark for attribute access on Unimodel instances.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_field_access
+"""
+import timeit
+
+SETUP = """
+from test.fixtures import NodeData, AllTypes, all_types_data
+node = NodeData(name="hans", age=7, skills={"a": 1})
+all_types = all_types_data[0]
+empty = NodeData()
+"""
+
+CASES = [
+    ("NodeData field get", "node.age"),
+    ("NodeData unset field get", "empty.age"),
+    ("NodeData field set", "node.age = 8"),
+    ("NodeData method lookup", "node.validate"),
+    ("AllTypes field get", "all_types.f_double"),
+    ("AllTypes field set", "all_types.f_double = 2.5"),
+]
+
+NUMBER = 200000
+REPEAT = 5
+
+
+def run():
+    for name, stmt in CASES:
+        best = min(timeit.repeat(
+            stmt, setup=SETUP, number=NUMBER, repeat=REPEAT))
+        print "%-28s %8.2f Mops/s" % (name, NUMBER / best / 1e6)
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,71 @@
+""" Bytes per instance of dict backed and compact Unimodel classes.
+
+Uses tracemalloc when it is available, otherwise sums sys.getsizeof()
+over each instance and its per-instance containers (field values are
+shared between instances, so they are not counted).
+
+Run from the repository root:
+
+    python -m benchmarks.bench_memory
+"""
+import gc
+import sys
+from unimodel.model import Unimodel, CompactUnimodel, Field
+from unimodel import types
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+class NodeData(Unimodel):
+    name = Field(types.UTF8)
+    age = Field(types.Int)
+    skills = Field(types.Map(types.UTF8, types.Int))
+
+
+class CompactNodeData(CompactUnimodel):
+    name = Field(types.UTF8)
+    age = Field(types.Int)
+    skills = Field(types.Map(types.UTF8, types.Int))
+
+COUNT = 100000
+NAME = "hans"
+SKILLS = {"guitar": 5}
+
+
+def make_instances(cls):
+    return [cls(name=NAME, age=7, skills=SKILLS) for _ in xrange(COUNT)]
+
+
+def size_with_tracemalloc(cls):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    instances = make_instances(cls)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # do not count the list holding the instances
+    return (after - before - sys.getsizeof(instances)) / float(COUNT)
+
+
+def size_with_getsizeof(cls):
+    obj = make_instances(cls)[0]
+    size = sys.getsizeof(obj) + sys.getsizeof(obj._model_data)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return float(size)
+
+
+def run():
+    if tracemalloc is not None:
+        method, measure = "tracemalloc", size_with_tracemalloc
+    else:
+        method, measure = "sys.getsizeof", size_with_getsizeof
+    print "bytes per instance (%s):" % method
+    for cls in (NodeData, CompactNodeData):
+        print "%-20s %8.1f" % (cls.__name__, measure(cls))
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,41 @@
+""" Microbenchmark for validating AllTypes instances.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_validate
+"""
+import timeit
+
+SETUP = """
+from test.fixtures import AllTypes, all_types_data
+from unimodel import types
+obj = all_types_data[0]
+f_list = AllTypes.get_field_definition("f_list")
+f_map = AllTypes.get_field_definition("f_map")
+f_enum = AllTypes.get_field_definition("f_enum")
+int_list = types.List(types.Int)
+numbers = range(1000)
+"""
+
+CASES = [
+    # mark_dirty() forces all fields to be checked again
+    ("AllTypes validate (all dirty)", "obj.mark_dirty(); obj.validate()"),
+    ("AllTypes validate (clean)", "obj.validate()"),
+    ("Field.validate list", "f_list.validate(obj.f_list)"),
+    ("Field.validate map", "f_map.validate(obj.f_map)"),
+    ("Field.validate enum", "f_enum.validate(obj.f_enum)"),
+    ("List(Int) 1000 elements", "int_list.validate(numbers)"),
+]
+
+NUMBER = 2000
+REPEAT = 5
+
+
+def run():
+    for name, stmt in CASES:
+        best = min(timeit.repeat(
+            stmt, setup=SETUP, number=NUMBER, repeat=REPEAT))
+        print "%-32s %10.2f us" % (name, best / NUMBER * 1e6)
+
+if __name__ == "__main__":
+    run()
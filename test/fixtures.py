@@ -1,4 +1,5 @@
-from unimodel.model import Unimodel, UnimodelUnion, Field, FieldFactory
+from unimodel.model import (Unimodel, UnimodelUnion, CompactUnimodel,
+                            FrozenUnimodel, Field, FieldFactory)
 from unimodel import types
 import sys
 
@@ -41,6 +42,33 @@ class AllTypes(Unimodel):
     f_jsondata = Field(types.JSONData)
     f_bigint = Field(types.BigInt)
 
+class CompactNode(CompactUnimodel):
+    age = Field(types.Int, default=0)
+    name = Field(types.UTF8)
+    skills = Field(types.Map(types.UTF8, types.Int))
+
+class CompactParent(CompactUnimodel):
+    node = Field(types.Struct(CompactNode))
+    nodes = Field(types.List(types.Struct(CompactNode)))
+    tags = Field(types.Tuple(types.UTF8, types.Int))
+
+class FrozenLeaf(FrozenUnimodel):
+    name = Field(types.UTF8)
+    tags = Field(types.Set(types.UTF8))
+
+class FrozenNode(FrozenUnimodel):
+    leaf = Field(types.Struct(FrozenLeaf))
+    numbers = Field(types.List(types.Int))
+    table = Field(types.Map(types.UTF8, types.List(types.Int)))
+    pair = Field(types.Tuple(types.UTF8, types.Int))
+
+def make_frozen_node():
+    return FrozenNode(
+        leaf=FrozenLeaf(name=u"a", tags=set([u"x"])),
+        numbers=[1, 2],
+        table={u"k": [3]},
+        pair=(u"p", 1))
+
 if sys.version < '3':
     import codecs
     def u(x):
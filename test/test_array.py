@@ -0,0 +1,111 @@
+import array
+from unittest import TestCase
+from unimodel.model import Unimodel, Field
+from unimodel.metadata import Metadata
+from unimodel.validation import ValidationException
+from unimodel import types
+from unimodel.backends.json.serializer import (JSONSerializer,
+                                               JSONValidationException)
+from unimodel.backends.thrift.serializer import ThriftSerializer, ThriftProtocol
+
+
+class Lists(Unimodel):
+    d = Field(types.List(types.Double))
+    i32 = Field(types.List(types.Int32))
+    i16 = Field(types.List(types.Int16))
+    i8 = Field(types.List(types.Int8))
+    i64 = Field(types.List(types.Int64))
+    nested = Field(types.List(types.List(types.Double)))
+
+
+class Arrays(Unimodel):
+    d = Field(types.Array(types.Double))
+    i32 = Field(types.Array(types.Int32))
+    i16 = Field(types.Array(types.Int16))
+    i8 = Field(types.Array(types.Int8))
+    i64 = Field(types.Array(types.Int64))
+    nested = Field(types.List(types.Array(types.Double)))
+
+
+def make_data(size):
+    doubles = [i * 0.25 - 3 for i in xrange(size)]
+    i32 = [i * 104729 - 2 ** 30 for i in xrange(size)]
+    i16 = [i * 7 - 2 ** 14 for i in xrange(size)]
+    i8 = [i % 256 - 128 for i in xrange(size)]
+    i64 = [i * 2 ** 50 - 2 ** 62 for i in xrange(size)]
+    lists = Lists(d=doubles, i32=i32, i16=i16, i8=i8, i64=i64,
+                  nested=[doubles, []])
+    int64_typecode = types.Array(types.Int64).typecode
+    arrays = Arrays(d=array.array('d', doubles),
+                    i32=array.array('i', i32),
+                    i16=array.array('h', i16),
+                    i8=array.array('b', i8),
+                    i64=array.array(int64_typecode, i64),
+                    nested=[array.array('d', doubles), array.array('d')])
+    return lists, arrays
+
+
+def get_serializers():
+    yield "json", JSONSerializer()
+    for protocol_name, protocol_factory in ThriftProtocol.iter():
+        yield protocol_name, ThriftSerializer(protocol_factory=protocol_factory)
+
+
+class ArrayTestCase(TestCase):
+
+    def test_validate(self):
+        t = types.Array(types.Int32)
+        t.validate(array.array('i', [1, 2]))
+        self.assertRaises(ValidationException, t.validate, [1, 2])
+        self.assertRaises(ValidationException, t.validate, array.array('d'))
+        self.assertRaises(Exception, types.Array, types.UTF8)
+        self.assertRaises(
+            Exception, types.Array, types.Enum({1: "one"}))
+
+        class PositiveValidator(object):
+
+            def validate(self, value):
+                if value <= 0:
+                    raise ValidationException("not positive")
+
+        t = types.Array(types.Int16(
+            metadata=Metadata(validators=[PositiveValidator()])))
+        t.validate(array.array('h', [1, 2]))
+        self.assertRaises(
+            ValidationException, t.validate, array.array('h', [1, 0]))
+
+    def test_wire_compatible_with_lists(self):
+        # readers of schemas see arrays as lists
+        self.assertTrue(types.type_id_to_type_constructor(
+            types.Array.type_id) is types.List)
+        for size in (0, 3, 1000):
+            lists, arrays = make_data(size)
+            for name, serializer in get_serializers():
+                encoded = serializer.serialize(arrays)
+                self.assertEquals(encoded, serializer.serialize(lists), name)
+                self.assertEquals(
+                    serializer.deserialize(Arrays, encoded), arrays, name)
+                self.assertEquals(
+                    serializer.deserialize(Lists, encoded), lists, name)
+
+    def test_read_invalid_json(self):
+        serializer = JSONSerializer()
+        self.assertRaises(
+            JSONValidationException, serializer.deserialize,
+            Arrays, '{"i8": [1, 1000]}')
+        self.assertRaises(
+            JSONValidationException, serializer.deserialize,
+            Arrays, '{"d": [1.0, "a"]}')
+
+    def test_read_in_place(self):
+        lists, arrays = make_data(100)
+        for name, serializer in get_serializers():
+            if name == "json":
+                continue
+            encoded = serializer.serialize(arrays)
+            buf = bytearray("head" + encoded)
+            self.assertEquals(
+                serializer.deserialize(Arrays, memoryview(buf)[4:]),
+                arrays, name)
+            self.assertRaises(
+                EOFError, serializer.deserialize, Arrays, encoded[:900])
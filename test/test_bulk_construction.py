@@ -0,0 +1,84 @@
+from unittest import TestCase
+from unimodel.model import Unimodel, CompactUnimodel, Field
+from unimodel.metadata import Metadata
+from unimodel.validation import ValidationException
+from unimodel import types
+from test.fixtures import NodeData
+
+
+class CompactNodeData(CompactUnimodel):
+    name = Field(types.UTF8)
+    age = Field(types.Int)
+    skills = Field(types.Map(types.UTF8, types.Int))
+
+
+class BulkConstructionTestCase(TestCase):
+
+    def test_from_rows(self):
+        for cls in (NodeData, CompactNodeData):
+            rows = [("a", 1, {"x": 1}), ("b", None, None)]
+            instances = cls.from_rows(rows, validate=True)
+            self.assertEquals(
+                instances,
+                [cls(name="a", age=1, skills={"x": 1}), cls(name="b")])
+
+    def test_from_rows_with_field_names(self):
+        for cls in (NodeData, CompactNodeData):
+            instances = cls.from_rows(
+                [(1, "a"), (2, "b")], field_names=["age", "name"])
+            self.assertEquals(
+                instances, [cls(name="a", age=1), cls(name="b", age=2)])
+            self.assertRaises(
+                ValueError, lambda: cls.from_rows([(1, "a", 3)], ["age"]))
+
+    def test_from_columns(self):
+        for cls in (NodeData, CompactNodeData):
+            instances = cls.from_columns(
+                [["a", "b"], [1, 2]], field_names=["name", "age"])
+            self.assertEquals(
+                instances, [cls(name="a", age=1), cls(name="b", age=2)])
+            self.assertRaises(
+                ValueError, lambda: cls.from_columns([["a"], [1, 2]]))
+            self.assertEquals(cls.from_columns([]), [])
+
+    def test_validation(self):
+        self.assertRaises(
+            ValidationException,
+            lambda: NodeData.from_rows(
+                [("a", 1, None), ("b", "x", None)], validate=True))
+        self.assertRaises(
+            ValidationException,
+            lambda: NodeData.from_columns(
+                [["a"], [1], [{"a": "b"}]], validate=True))
+        # without validation bad values are not noticed
+        NodeData.from_rows([("b", "x", None)])
+        # instances validated in bulk are not validated again
+        for cls in (NodeData, CompactNodeData):
+            objs = cls.from_rows([("a", 1, {"b": 2})], validate=True)
+            self.assertEquals(objs[0]._dirty, 0)
+            objs = cls.from_columns([["a"], [1], [None]], validate=True)
+            self.assertEquals(objs[0]._dirty, 0)
+            self.assertEquals(cls.from_rows([("a", 1, None)])[0]._dirty, -1)
+
+    def test_required_fields_and_model_validators(self):
+        class NotFive(object):
+
+            def validate(self, obj):
+                if obj.a == 5:
+                    raise ValidationException("a is five")
+
+        class A(Unimodel):
+            a = Field(types.Int, required=True)
+            b = Field(types.Int)
+            metadata = Metadata(validators=[NotFive()])
+
+        A.from_columns([[1, 2], [None, 3]], validate=True)
+        self.assertRaises(
+            ValidationException,
+            lambda: A.from_columns([[1, None], [1, 2]], validate=True))
+        self.assertRaises(
+            ValidationException,
+            lambda: A.from_columns([[1]], field_names=["b"], validate=True))
+        self.assertRaises(
+            ValidationException,
+            lambda: A.from_rows([(5, 1)], validate=True))
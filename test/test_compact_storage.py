@@ -0,0 +1,84 @@
+from unittest import TestCase
+import pickle
+from unimodel.model import CompactUnimodel, Field
+from unimodel import types
+from unimodel.backends.json.serializer import JSONSerializer
+from unimodel.backends.thrift.serializer import ThriftSerializer, ThriftProtocol
+from test.fixtures import (
+    NodeData, TestUnion, A, CompactNode, CompactParent, tree_data,
+    make_frozen_node)
+
+
+class CompactChild(CompactNode):
+    nickname = Field(types.UTF8)
+
+
+class CompactStorageTestCase(TestCase):
+
+    def test_no_instance_dict(self):
+        obj = CompactNode(name="a")
+        self.assertFalse(hasattr(obj, '__dict__'))
+        self.assertFalse(hasattr(CompactChild(), '__dict__'))
+        self.assertRaises(AttributeError, lambda: setattr(obj, 'x', 1))
+
+    def test_dense_field_index(self):
+        class Sparse(CompactUnimodel):
+            a = Field(types.UTF8, field_id=3)
+            b = Field(types.Int, field_id=1)
+            c = Field(types.Int, field_id=7)
+
+        self.assertEquals(Sparse._field_index, {1: 0, 3: 1, 7: 2})
+        obj = Sparse(a="a", c=1)
+        self.assertEquals(obj._model_data, [None, "a", 1])
+
+    def test_storage_semantics(self):
+        obj = CompactNode(name="a")
+        self.assertEquals(obj.age, 0)
+        self.assertEquals(obj._get_value_by_field_id(1), None)
+        obj._set_value_by_field_id(1, 5)
+        self.assertEquals(obj.age, 5)
+        self.assertEquals(obj['age'], 5)
+        self.assertEquals(list(obj.items()), [("age", 5), ("name", "a")])
+        del obj['age']
+        self.assertRaises(KeyError, lambda: obj.__delitem__('age'))
+        self.assertEquals(list(obj.items()), [("name", "a")])
+        self.assertEquals(obj, CompactNode(name="a"))
+        self.assertNotEquals(obj, CompactNode(name="b"))
+        self.assertEquals(repr(obj), "CompactNode(name='a')")
+
+    def test_inheritance(self):
+        obj = CompactChild(name="a", nickname="b")
+        self.assertEquals(CompactChild._field_count, 4)
+        self.assertEquals(obj.nickname, "b")
+        self.assertEquals(obj.name, "a")
+
+    def test_serialize(self):
+        data = CompactParent(
+            node=CompactNode(name=u"\u00e1", age=3),
+            nodes=[CompactNode(name=u"b", age=0, skills={u"c": 1})],
+            tags=(u"x", 1))
+        serializer = JSONSerializer()
+        self.assertEquals(
+            data, serializer.deserialize(
+                CompactParent, serializer.serialize(data)))
+        for protocol_name, protocol_factory in ThriftProtocol.iter():
+            serializer = ThriftSerializer(protocol_factory=protocol_factory)
+            self.assertEquals(
+                data, serializer.deserialize(
+                    CompactParent, serializer.serialize(data)),
+                protocol_name)
+
+    def test_pickle(self):
+        read_back = ThriftSerializer().deserialize(
+            NodeData, ThriftSerializer().serialize(NodeData(name=u"\u00e1")))
+        for data in [
+                CompactParent(node=CompactNode(name=u"a"), tags=(u"x", 1)),
+                tree_data, read_back, make_frozen_node(), TestUnion(f2=A(f=1))]:
+            for protocol in xrange(0, pickle.HIGHEST_PROTOCOL + 1):
+                copy = pickle.loads(pickle.dumps(data, protocol))
+                self.assertEquals(copy, data)
+                self.assertEquals(copy._value_converter, None)
+        frozen = pickle.loads(pickle.dumps(make_frozen_node()))
+        self.assertEquals(hash(frozen), hash(make_frozen_node()))
+        union = pickle.loads(pickle.dumps(TestUnion(f2=A(f=1))))
+        self.assertEquals(union.current_value(), A(f=1))
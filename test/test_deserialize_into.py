@@ -0,0 +1,100 @@
+from unittest import TestCase
+from unimodel.model import Unimodel, Field, FrozenInstanceError
+from unimodel import types
+from unimodel.backends.json.serializer import JSONSerializer
+from unimodel.backends.thrift.serializer import ThriftSerializer, ThriftProtocol
+from test.fixtures import FrozenLeaf, all_types_data
+
+
+class Inner(Unimodel):
+    name = Field(types.UTF8)
+    numbers = Field(types.List(types.Int))
+
+
+class Outer(Unimodel):
+    first = Field(types.Struct(Inner))
+    second = Field(types.Struct(Inner))
+    count = Field(types.Int)
+
+
+class Pooled(Unimodel):
+    x = Field(types.Int)
+
+
+class PooledChild(Pooled):
+    pass
+
+
+def get_serializers():
+    yield "json", JSONSerializer()
+    for protocol_name, protocol_factory in ThriftProtocol.iter():
+        yield protocol_name, ThriftSerializer(protocol_factory=protocol_factory)
+
+
+class DeserializeIntoTestCase(TestCase):
+
+    def test_reuses_instances(self):
+        for name, serializer in get_serializers():
+            target = Outer(first=Inner(name=u"old", numbers=[9]),
+                           second=Inner(name=u"other"),
+                           count=3)
+            first, second = target.first, target.second
+            data = Outer(first=Inner(name=u"a", numbers=[1, 2]),
+                         second=Inner(numbers=[3]))
+            result = serializer.deserialize_into(
+                target, serializer.serialize(data))
+            self.assertTrue(result is target, name)
+            self.assertEquals(target, data, name)
+            self.assertEquals(target.count, None, name)
+            self.assertTrue(target.first is first, name)
+            self.assertTrue(target.second is second, name)
+            self.assertEquals(second.name, None, name)
+
+    def test_all_types(self):
+        for name, serializer in get_serializers():
+            target = all_types_data[1].__class__()
+            for data in all_types_data:
+                serializer.deserialize_into(target, serializer.serialize(data))
+                self.assertEquals(
+                    target, serializer.deserialize(
+                        data.__class__, serializer.serialize(data)), name)
+
+    def test_frozen(self):
+        leaf = FrozenLeaf(name=u"a")
+        serializer = JSONSerializer()
+        self.assertRaises(
+            FrozenInstanceError, serializer.deserialize_into,
+            leaf, serializer.serialize(FrozenLeaf(name=u"b")))
+
+
+class PoolTestCase(TestCase):
+
+    def setUp(self):
+        Pooled.set_pool_size(2)
+
+    def tearDown(self):
+        Pooled.set_pool_size(0)
+
+    def test_acquire_release(self):
+        objs = [Pooled(x=i) for i in xrange(3)]
+        for obj in objs:
+            obj.release()
+        self.assertEquals(len(Pooled._free_list), 2)
+        obj = Pooled.acquire()
+        self.assertTrue(obj is objs[1])
+        self.assertEquals(obj.x, None)
+        # subclasses have their own pool
+        child = PooledChild.acquire()
+        self.assertEquals(child.__class__, PooledChild)
+        child.release()
+        self.assertEquals(len(Pooled._free_list), 1)
+
+    def test_deserializers_use_pool(self):
+        released = Pooled(x=5)
+        released.release()
+        for name, serializer in get_serializers():
+            s = serializer.serialize(Pooled(x=1))
+            obj = serializer.deserialize(Pooled, s)
+            self.assertTrue(obj is released, name)
+            self.assertEquals(obj.x, 1)
+            obj.release()
@@ -0,0 +1,83 @@
+from unittest import TestCase
+from unimodel.model import Unimodel, Field
+from unimodel import types
+from test.fixtures import NodeData
+
+
+class FieldAccessTestCase(TestCase):
+
+    def test_default_value(self):
+        class A(Unimodel):
+            a = Field(types.Int, default=3)
+            b = Field(types.Int)
+
+        obj = A()
+        self.assertEquals(obj.a, 3)
+        self.assertEquals(obj.b, None)
+        obj.a = 5
+        self.assertEquals(obj.a, 5)
+        self.assertEquals(obj['a'], 5)
+        del obj.a
+        self.assertEquals(obj.a, 3)
+        self.assertEquals(list(obj.items()), [])
+
+    def test_class_attribute_is_field_definition(self):
+        field = NodeData.age
+        self.assertTrue(isinstance(field, Field))
+        self.assertEquals(field, NodeData.get_field_definition("age"))
+
+    def test_non_field_attributes(self):
+        obj = NodeData(name="a")
+        obj.extra = 1
+        self.assertEquals(obj.extra, 1)
+        self.assertEquals(list(obj.items()), [("name", "a")])
+
+
+class GeneratedMethodsTestCase(TestCase):
+
+    def test_positional_arguments(self):
+        obj = NodeData(u"a", 3)
+        self.assertEquals(obj.name, u"a")
+        self.assertEquals(obj.age, 3)
+        self.assertEquals(obj, NodeData(age=3, name=u"a"))
+        self.assertRaises(TypeError, lambda: NodeData(1, 2, 3, 4))
+
+    def test_non_identifier_field_names(self):
+        class A(Unimodel):
+            a = Field(types.Int, field_name="a-b")
+            b = Field(types.Int)
+
+        obj = A(**{"a-b": 1, "b": 2})
+        self.assertEquals(obj["a-b"], 1)
+        self.assertEquals(A(3).b, 3)
+        self.assertEquals(list(obj.items()), [("a-b", 1), ("b", 2)])
+        self.assertEquals(repr(obj), "A(a-b=1, b=2)")
+
+        class B(Unimodel):
+            a = Field(types.UTF8, field_name="100%s")
+
+        self.assertEquals(repr(B(**{"100%s": u"x"})), "B(100%s=u'x')")
+
+    def test_hand_written_methods_are_kept(self):
+        class A(Unimodel):
+            a = Field(types.Int)
+
+            def __init__(self, a=1, **kwargs):
+                super(A, self).__init__(a=a * 10, **kwargs)
+
+            def __repr__(self):
+                return "custom"
+
+        class B(A):
+            b = Field(types.Int)
+
+        self.assertEquals(A().a, 10)
+        self.assertEquals(B(a=2, b=3).a, 20)
+        self.assertEquals(B(a=2, b=3).b, 3)
+        self.assertEquals(repr(B()), "custom")
+        self.assertEquals(list(B(b=1).items()), [("a", 10), ("b", 1)])
+
+    def test_repr(self):
+        self.assertEquals(
+            repr(NodeData(skills={"a": 1}, name="x")),
+            "NodeData(name='x', skills={'a': 1})")
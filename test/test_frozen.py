@@ -0,0 +1,91 @@
+from unittest import TestCase
+from unimodel.model import (FrozenUnimodel, CompactUnimodel,
+                            FrozenInstanceError, Field)
+from unimodel.metadata import Metadata
+from unimodel.validation import ValidationException
+from unimodel import types
+from unimodel.backends.json.serializer import JSONSerializer
+from unimodel.backends.thrift.serializer import ThriftSerializer, ThriftProtocol
+from test.fixtures import NodeData, FrozenLeaf, FrozenNode, make_frozen_node
+
+
+class CompactFrozenLeaf(FrozenUnimodel, CompactUnimodel):
+    name = Field(types.UTF8)
+    tags = Field(types.Set(types.UTF8))
+
+
+class FrozenModelTestCase(TestCase):
+
+    def test_rejects_mutation(self):
+        node = make_frozen_node()
+        self.assertRaises(FrozenInstanceError, lambda: setattr(node, 'numbers', []))
+        self.assertRaises(FrozenInstanceError, lambda: delattr(node, 'numbers'))
+        self.assertRaises(FrozenInstanceError, lambda: node.__setitem__('pair', None))
+        self.assertRaises(FrozenInstanceError, lambda: setattr(node, 'other', 1))
+        self.assertRaises(TypeError, lambda: node.numbers.append(3))
+        self.assertRaises(TypeError, lambda: node.table[u"k"].append(3))
+        self.assertRaises(TypeError, lambda: node.table.update({}))
+        self.assertRaises(TypeError, lambda: node.leaf.tags.add(u"y"))
+        self.assertEquals(node.numbers, [1, 2])
+
+    def test_hashable(self):
+        self.assertEquals(hash(make_frozen_node()), hash(make_frozen_node()))
+        self.assertEquals(len(set([make_frozen_node(), make_frozen_node()])), 1)
+        d = {make_frozen_node(): 1}
+        self.assertEquals(d[make_frozen_node()], 1)
+        self.assertNotEquals(make_frozen_node(), FrozenNode(numbers=[1]))
+        leaves = set([CompactFrozenLeaf(name=u"a"), CompactFrozenLeaf(name=u"a")])
+        self.assertEquals(len(leaves), 1)
+
+    def test_nested_structs_must_be_frozen(self):
+        class A(FrozenUnimodel):
+            node = Field(types.Struct(NodeData))
+
+        self.assertRaises(TypeError, lambda: A(node=NodeData(name=u"a")))
+
+    def test_cached_validation(self):
+        calls = []
+
+        class Counter(object):
+
+            def validate(self, value):
+                calls.append(value)
+                if value < 0:
+                    raise ValidationException("negative")
+
+        class A(FrozenUnimodel):
+            a = Field(types.Int(metadata=Metadata(validators=[Counter()])))
+
+        class B(FrozenUnimodel):
+            children = Field(types.List(types.Struct(A)))
+
+        b = B(children=[A(a=1), A(a=2)])
+        b.validate()
+        b.validate()
+        self.assertEquals(calls, [1, 2])
+        bad = A(a=-1)
+        self.assertRaises(ValidationException, lambda: bad.validate())
+        self.assertRaises(ValidationException, lambda: bad.validate())
+        self.assertEquals(calls, [1, 2, -1])
+
+    def test_from_rows(self):
+        leaves = FrozenLeaf.from_rows([(u"a", set([u"x"]))])
+        self.assertRaises(TypeError, lambda: leaves[0].tags.add(u"y"))
+        self.assertEquals(hash(leaves[0]), hash(FrozenLeaf(u"a", set([u"x"]))))
+
+    def test_serialize(self):
+        data = make_frozen_node()
+        serializer = JSONSerializer()
+        read_data = serializer.deserialize(
+            FrozenNode, serializer.serialize(data))
+        self.assertEquals(data, read_data)
+        self.assertEquals(hash(data), hash(read_data))
+        self.assertRaises(TypeError, lambda: read_data.numbers.append(1))
+        for protocol_name, protocol_factory in ThriftProtocol.iter():
+            serializer = ThriftSerializer(protocol_factory=protocol_factory)
+            read_data = serializer.deserialize(
+                FrozenNode, serializer.serialize(data))
+            self.assertEquals(data, read_data, protocol_name)
+            self.assertEquals(hash(data), hash(read_data))
+            self.assertRaises(
+                FrozenInstanceError, lambda: setattr(read_data, 'numbers', []))
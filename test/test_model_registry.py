@@ -51,3 +51,40 @@ class ModelRegistryTestCase(TestCase):
         # methods of impl classes can be called
         self.assertEquals(data_read.useful_method(), 6)
         self.assertEquals(data_read.nested.another_method(1), 7)
+
+    def test_lookup_interface(self):
+        class Iface(Unimodel):
+            x = Field(Int)
+
+        class Impl(Iface):
+            pass
+
+        class SubImpl(Impl):
+            pass
+
+        class Other(Unimodel):
+            pass
+
+        model_registry = ModelRegistry()
+        model_registry.register(Iface, Impl)
+        self.assertEquals(model_registry.lookup_interface(Impl), Iface)
+        self.assertEquals(model_registry.lookup_interface(Iface), Iface)
+        self.assertEquals(model_registry.lookup_interface(SubImpl), SubImpl)
+        self.assertEquals(model_registry.lookup_interface(Other), Other)
+        # registering invalidates cached results
+        model_registry.register(Other, SubImpl)
+        self.assertEquals(model_registry.lookup_interface(SubImpl), Other)
+
+    def test_registry_change_after_use(self):
+        class Iface(Unimodel):
+            x = Field(Int)
+
+        class Impl(Iface):
+            pass
+
+        model_registry = ModelRegistry()
+        serializer = JSONSerializer(model_registry=model_registry)
+        s = serializer.serialize(Iface(x=1))
+        self.assertEquals(serializer.deserialize(Iface, s).__class__, Iface)
+        model_registry.register(Iface, Impl)
+        self.assertEquals(serializer.deserialize(Iface, s).__class__, Impl)
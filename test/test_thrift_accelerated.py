@@ -0,0 +1,101 @@
+from unittest import TestCase
+from unimodel.model import Unimodel, CompactUnimodel, Field
+from unimodel import types
+from unimodel.backends.thrift.serializer import ThriftSerializer, ThriftProtocol
+from test.fixtures import (
+    NodeData, TreeNode, AllTypes, TestUnion, FrozenLeaf, tree_data,
+    all_types_data)
+
+
+class Leaf(Unimodel):
+    name = Field(types.UTF8)
+    age = Field(types.Int)
+    skills = Field(types.Map(types.UTF8, types.Int))
+
+
+class CompactLeaf(CompactUnimodel):
+    name = Field(types.UTF8)
+
+
+class Base(Unimodel):
+    a = Field(types.Int)
+
+
+class Sub(Base):
+    b = Field(types.Int)
+
+
+class Holder(Unimodel):
+    x = Field(types.Struct(Base))
+
+
+class Plain(Unimodel):
+    node = Field(types.Struct(Leaf))
+    nodes = Field(types.List(types.Struct(CompactLeaf)))
+    labels = Field(types.Map(types.Int, types.Set(types.UTF8)))
+    text = Field(types.UTF8, default=u"default")
+    flag = Field(types.Bool)
+    ratio = Field(types.Double)
+
+
+class AcceleratedTestCase(TestCase):
+
+    def setUp(self):
+        self.serializer = ThriftSerializer()
+        self.accelerated = ThriftSerializer(accelerated=True)
+
+    def test_accelerated_classes(self):
+        get_spec = self.accelerated.spec_factory.get_accelerated_spec
+        self.assertNotEquals(get_spec(NodeData), None)
+        self.assertNotEquals(get_spec(Plain), None)
+        # recursive structs, unions, frozen models and structs with
+        # fields which need conversion are left to the engine
+        for struct_class in [
+                TreeNode, TestUnion, FrozenLeaf, AllTypes, Holder]:
+            self.assertEquals(get_spec(struct_class), None)
+
+    def test_subclassed_structs(self):
+        class Parent(Unimodel):
+            a = Field(types.Int)
+
+        class ParentHolder(Unimodel):
+            x = Field(types.Struct(Parent))
+
+        get_spec = self.accelerated.spec_factory.get_accelerated_spec
+        self.assertNotEquals(get_spec(ParentHolder), None)
+
+        # defining a subclass later drops the cached spec
+        class Child(Parent):
+            b = Field(types.Int)
+
+        self.assertEquals(get_spec(ParentHolder), None)
+        obj = ParentHolder(x=Child(a=1, b=2))
+        self.assertEquals(
+            self.accelerated.serialize(obj), self.serializer.serialize(obj))
+
+    def test_same_output(self):
+        data = [tree_data, Plain(
+            node=Leaf(name=u"\u00e1", age=1, skills={"a": 1}),
+            nodes=[CompactLeaf(name=u"x")],
+            labels={1: set(["a", "b"])},
+            flag=False,
+            ratio=0.5), Holder(x=Sub(a=1, b=2))] + all_types_data
+        for obj in data:
+            s = self.serializer.serialize(obj)
+            self.assertEquals(self.accelerated.serialize(obj), s)
+            self.assertEquals(
+                self.accelerated.deserialize(obj.__class__, s),
+                self.serializer.deserialize(obj.__class__, s))
+
+    def test_lazy_strings(self):
+        s = self.serializer.serialize(NodeData(name=u"\u00e1"))
+        obj = self.accelerated.deserialize(NodeData, s)
+        self.assertTrue(isinstance(
+            obj._get_value_by_field_id(1), types.LazyValue))
+        self.assertEquals(obj.name, u"\u00e1")
+
+    def test_binary_protocol_only(self):
+        self.assertRaises(
+            ValueError, ThriftSerializer,
+            protocol_factory=ThriftProtocol('json').factory,
+            accelerated=True)
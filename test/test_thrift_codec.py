@@ -0,0 +1,67 @@
+from unittest import TestCase
+from unimodel.model import Unimodel, Field
+from unimodel import types
+from unimodel.backends.thrift.serializer import ThriftSerializer, ThriftProtocol
+from test.fixtures import (
+    TreeNode, TestUnion, NodeData, A, CompactNode, CompactParent,
+    tree_data, all_types_data, make_frozen_node)
+
+
+class Nested(Unimodel):
+    pair = Field(types.Tuple(
+        types.UTF8,
+        types.Tuple(types.Int, types.UTF8),
+        types.List(types.Int)))
+    table = Field(types.Map(types.UTF8, types.List(types.Struct(A))))
+    flag = Field(types.Bool, default=True)
+
+
+def get_serializer_pairs():
+    for protocol_name, protocol_factory in ThriftProtocol.iter():
+        yield (protocol_name,
+               ThriftSerializer(protocol_factory=protocol_factory),
+               ThriftSerializer(protocol_factory=protocol_factory,
+                                engine="compiled"))
+
+
+class CompiledEngineTestCase(TestCase):
+
+    def assert_same_output(self, data):
+        for name, spec_serializer, compiled in get_serializer_pairs():
+            s = spec_serializer.serialize(data)
+            self.assertEquals(compiled.serialize(data), s, name)
+            self.assertEquals(
+                compiled.deserialize(data.__class__, s),
+                spec_serializer.deserialize(data.__class__, s), name)
+
+    def test_fixtures(self):
+        self.assert_same_output(tree_data)
+        for data in all_types_data:
+            self.assert_same_output(data)
+
+    def test_nested_types(self):
+        self.assert_same_output(Nested(
+            pair=(u"\u00e1", (1, u"b"), [2, 3]),
+            table={u"x": [A(f=1), A()]}))
+        # defaults are written for unset fields
+        self.assert_same_output(Nested(flag=None))
+
+    def test_storage_modes(self):
+        self.assert_same_output(CompactParent(
+            node=CompactNode(name=u"a"),
+            nodes=[CompactNode(age=3)],
+            tags=(u"t", 1)))
+        self.assert_same_output(make_frozen_node())
+        self.assert_same_output(TestUnion(f2=A(f=1)))
+
+    def test_deserialize_into(self):
+        for name, spec_serializer, compiled in get_serializer_pairs():
+            target = TreeNode(data=NodeData(name=u"old"))
+            data = target.data
+            source = TreeNode(data=NodeData(name=u"new", age=3))
+            compiled.deserialize_into(target, compiled.serialize(source))
+            self.assertEquals(target, source, name)
+            self.assertTrue(target.data is data)
+
+    def test_unknown_engine(self):
+        self.assertRaises(ValueError, ThriftSerializer, engine="fast")
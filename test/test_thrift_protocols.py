@@ -1,7 +1,18 @@
 from unittest import TestCase
+import array
+import threading
 from test.fixtures import NodeData, TreeNode, AllTypes, tree_data, all_types_data
 from test.helpers import flatten
-from unimodel.backends.thrift.serializer import ThriftSerializer, ThriftProtocol
+from unimodel.model import CompactUnimodel, Field
+from unimodel import types
+from unimodel.backends.json.serializer import JSONSerializer
+from unimodel.backends.thrift.serializer import (
+    ThriftSerializer, ThriftProtocol, ThriftValueConverter)
+
+
+class CompactJSONHolder(CompactUnimodel):
+    name = Field(types.UTF8)
+    data = Field(types.JSONData)
 
 
 class ThriftProtocolTestCase(TestCase):
@@ -30,3 +41,124 @@ class ThriftProtocolTestCase(TestCase):
                     d,
                     "%s serializes all_fields[%s]" %
                     (protocol_name, ix))
+
+    def test_lazy_json_data(self):
+        field_id = AllTypes.get_field_definition("f_jsondata").field_id
+        for protocol_name, protocol_factory in ThriftProtocol.iter():
+            serializer = ThriftSerializer(protocol_factory=protocol_factory)
+            s = serializer.serialize(all_types_data[0])
+            d = serializer.deserialize(AllTypes, s)
+            self.assertTrue(isinstance(
+                d._get_value_by_field_id(field_id), types.LazyValue))
+            # untouched values are written as they were read
+            self.assertEquals(serializer.serialize(d), s, protocol_name)
+            self.assertEquals(d, all_types_data[0])
+            # the decoded value replaces the raw text on first read
+            d.f_jsondata["data"].append(4)
+            self.assertEquals(d.f_jsondata, {"data": [1, 2, 3, {"b": []}, 4]})
+            d = serializer.deserialize(AllTypes, serializer.serialize(d))
+            self.assertEquals(d.f_jsondata, {"data": [1, 2, 3, {"b": []}, 4]})
+
+    def test_lazy_json_data_other_readers(self):
+        serializer = ThriftSerializer()
+        data = CompactJSONHolder(name=u"a", data=[1, {u"b": 2}])
+        d = serializer.deserialize(
+            CompactJSONHolder, serializer.serialize(data))
+        self.assertEquals(d["data"], [1, {"b": 2}])
+        d = serializer.deserialize(
+            CompactJSONHolder, serializer.serialize(data))
+        self.assertEquals(repr(d), repr(data))
+        self.assertEquals(
+            JSONSerializer().serialize(d), JSONSerializer().serialize(data))
+
+    def test_lazy_utf8(self):
+        field_id = NodeData.get_field_definition("name").field_id
+        for protocol_name, protocol_factory in ThriftProtocol.iter():
+            serializer = ThriftSerializer(protocol_factory=protocol_factory)
+            data = NodeData(name=u"\u00e1rv\u00edzt\u00fcr\u00f6", age=3)
+            s = serializer.serialize(data)
+            d = serializer.deserialize(NodeData, s)
+            # validating (before writing) does not decode strings
+            self.assertEquals(serializer.serialize(d), s, protocol_name)
+            if protocol_name != "json":
+                # the json protocol returns non-ascii strings decoded
+                self.assertTrue(isinstance(
+                    d._get_value_by_field_id(field_id), types.LazyValue))
+            self.assertEquals(d, data)
+            self.assertEquals(d.name, data.name)
+            self.assertEquals(type(d.name), unicode)
+            self.assertEquals(d._get_value_by_field_id(field_id), data.name)
+
+    def test_value_converters(self):
+        converter = ThriftValueConverter.get(NodeData)
+        self.assertTrue(ThriftValueConverter.get(NodeData) is converter)
+        self.assertEquals(converter.to_internal_functions.keys(), [
+            NodeData.get_field_definition("name").field_id])
+        # TreeNode only holds structs, so its fields are not converted
+        self.assertFalse(ThriftValueConverter.get(TreeNode).needs_conversion)
+
+        # subclasses get their own converter
+        class MoreNodeData(NodeData):
+            big = Field(types.BigInt)
+
+        self.assertEquals(
+            len(ThriftValueConverter.get(MoreNodeData).to_internal_functions),
+            2)
+
+    def test_serialize_into(self):
+        for protocol_name, protocol_factory in ThriftProtocol.iter():
+            serializer = ThriftSerializer(protocol_factory=protocol_factory)
+            s = serializer.serialize(tree_data)
+            buf = bytearray("head")
+            self.assertEquals(
+                serializer.serialize_into(tree_data, buf, 4), len(s))
+            self.assertEquals(str(buf), "head" + s, protocol_name)
+            # fixed size buffers are written in place
+            view = memoryview(bytearray(len(s) + 2))
+            self.assertEquals(
+                serializer.serialize_into(tree_data, view, 1), len(s))
+            self.assertEquals(view[1:-1].tobytes(), s)
+            self.assertRaises(
+                ValueError, serializer.serialize_into, tree_data, view, 3)
+            self.assertRaises(
+                ValueError, serializer.serialize_into, tree_data, buf,
+                len(buf) + 1)
+            self.assertRaises(
+                ValueError, serializer.serialize_into, tree_data, buf, -1)
+            self.assertRaises(
+                ValueError, serializer.serialize_into, tree_data,
+                array.array('c', "x" * 1000), 0)
+
+    def test_deserialize_buffer(self):
+        for protocol_name, protocol_factory in ThriftProtocol.iter():
+            serializer = ThriftSerializer(protocol_factory=protocol_factory)
+            buf = bytearray("head")
+            serializer.serialize_into(all_types_data[0], buf, 4)
+            self.assertEquals(
+                serializer.deserialize(AllTypes, memoryview(buf)[4:]),
+                all_types_data[0], protocol_name)
+
+    def test_protocol_pool(self):
+        serializer = ThriftSerializer(validate_before_write=False)
+        s = serializer.serialize(tree_data)
+        serializer.deserialize(TreeNode, s)
+        write_protocol = serializer.protocol_pool.write_protocol
+        read_protocol = serializer.protocol_pool.read_protocol
+        self.assertEquals(serializer.serialize(tree_data), s)
+        self.assertEquals(serializer.deserialize(TreeNode, s), tree_data)
+        self.assertTrue(serializer.protocol_pool.write_protocol is
+                        write_protocol)
+        self.assertTrue(serializer.protocol_pool.read_protocol is
+                        read_protocol)
+        # protocols which fail to write a message are dropped
+        self.assertRaises(
+            Exception, serializer.serialize, NodeData(name=u"a", age="b"))
+        self.assertEquals(serializer.protocol_pool.write_protocol, None)
+        self.assertEquals(serializer.serialize(tree_data), s)
+        # each thread has its own pool
+        protocols = []
+        thread = threading.Thread(target=lambda: protocols.append(
+            serializer.protocol_pool.write_protocol))
+        thread.start()
+        thread.join()
+        self.assertEquals(protocols, [None])
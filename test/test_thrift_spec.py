@@ -1,8 +1,10 @@
 from unittest import TestCase
 from thrift.Thrift import TType
-from unimodel.model import Unimodel, Field
+from unimodel.model import Unimodel, Field, FieldFactory, ModelRegistry
 from unimodel import types
-from unimodel.backends.thrift.serializer import ThriftSpecFactory
+from unimodel.backends.thrift.serializer import (
+    ThriftSpecFactory, ThriftSerializer, ThriftProtocol, ThriftTupleAdapter,
+    ThriftValueConverter)
 from unimodel.util import get_backend_type
 
 
@@ -78,3 +80,104 @@ class ThriftSpecTestCase(TestCase):
             f = field
         struct_spec = self.spec_factory.get_spec_for_struct(F)
         self.assertEquals(struct_spec, [None, (1, 10, 'f', None, None)])
+
+    def test_sparse_field_ids(self):
+        class Sparse(Unimodel):
+            a = Field(types.Int, field_id=2)
+            b = Field(types.UTF8, field_id=5)
+
+        struct_spec = self.spec_factory.get_spec_for_struct(Sparse)
+        self.assertEquals(struct_spec, [
+            None, None, (2, 10, 'a', None, None),
+            None, None, (5, 11, 'b', None, None)])
+        for protocol_name, protocol_factory in ThriftProtocol.iter():
+            serializer = ThriftSerializer(protocol_factory=protocol_factory)
+            data = Sparse(a=1, b=u"x")
+            self.assertEquals(
+                serializer.deserialize(Sparse, serializer.serialize(data)),
+                data, protocol_name)
+
+
+class ThriftSpecCacheTestCase(TestCase):
+
+    def test_shared_cache(self):
+        class Cached(Unimodel):
+            a = Field(types.Int)
+
+        serializer = ThriftSerializer()
+        info = serializer.spec_factory.get_cache_info()
+        serializer.serialize(Cached(a=1))
+        spec = serializer.spec_factory.get_spec(Cached)
+        # serializers with other (empty) registries use the same specs
+        other = ThriftSerializer()
+        self.assertTrue(other.spec_factory.get_spec(Cached) is spec)
+        new_info = other.spec_factory.get_cache_info()
+        self.assertEquals(new_info['misses'], info['misses'] + 1)
+        self.assertEquals(new_info['hits'], info['hits'] + 2)
+
+    def test_registry_change(self):
+        class Iface(Unimodel):
+            a = Field(types.Int)
+
+        class Holder(Unimodel):
+            value = Field(types.Struct(Iface))
+
+        class Impl(Iface):
+            pass
+
+        registry = ModelRegistry()
+        registry.register(Holder, Holder)
+        spec_factory = ThriftSpecFactory(registry)
+        self.assertEquals(spec_factory.get_spec(Holder)[1][3][0], Iface)
+        # registries with registrations have their own cache
+        self.assertEquals(
+            ThriftSpecFactory().get_spec(Holder)[1][3][0], Iface)
+        registry.register(Iface, Impl)
+        self.assertEquals(spec_factory.get_spec(Holder)[1][3][0], Impl)
+        self.assertEquals(
+            ThriftSpecFactory().get_spec(Holder)[1][3][0], Iface)
+
+    def test_tuple_struct_classes(self):
+        class Pairs(Unimodel):
+            pair = Field(types.Tuple(types.Int, types.UTF8))
+            pairs = Field(types.List(types.Tuple(types.Int, types.UTF8)))
+
+        serializer = ThriftSerializer()
+        spec = serializer.spec_factory.get_spec(Pairs)
+        tuple_struct_class = spec[1][3][0]
+        # the same class and spec for each Tuple type
+        self.assertTrue(spec[2][3][1][0] is tuple_struct_class)
+        self.assertTrue(spec[2][3][1][1] is spec[1][3][1])
+        self.assertTrue(ThriftSpecFactory().get_spec(Pairs)[1][3][0]
+                        is tuple_struct_class)
+        data = Pairs(pair=(1, u"\u00e1"), pairs=[(2, u"a"), (3, u"b")])
+        info = serializer.spec_factory.get_cache_info()
+        class_count = len(ThriftTupleAdapter.tuple_struct_classes)
+        for i in xrange(3):
+            self.assertEquals(
+                serializer.deserialize(Pairs, serializer.serialize(data)),
+                data)
+        self.assertEquals(
+            serializer.spec_factory.get_cache_info()['size'], info['size'])
+        self.assertEquals(
+            len(ThriftTupleAdapter.tuple_struct_classes), class_count)
+
+    def test_fields_change(self):
+        class Changing(Unimodel):
+            a = Field(types.Int)
+
+        class Holder(Unimodel):
+            value = Field(types.Struct(Changing))
+
+        serializers = [ThriftSerializer(), ThriftSerializer(engine="compiled"),
+                       ThriftSerializer(accelerated=True)]
+        for serializer in serializers:
+            serializer.serialize(Holder(value=Changing(a=1)))
+        FieldFactory().add_fields(Changing, {
+            'a': Field(types.Int), 'b': Field(types.UTF8, default=u"x")})
+        self.assertTrue(ThriftValueConverter.get(Changing).needs_conversion)
+        data = Holder(value=Changing(a=1, b=u"\u00e1"))
+        for serializer in serializers:
+            self.assertEquals(
+                serializer.deserialize(Holder, serializer.serialize(data)),
+                data)
@@ -0,0 +1,109 @@
+from unittest import TestCase
+from unimodel import types
+
+
+class TypeRegistryTestCase(TestCase):
+
+    def test_builtin_types(self):
+        self.assertEquals(types.type_id_to_type_constructor(1), types.Int64)
+        # Array shares its type id with List
+        self.assertEquals(types.type_id_to_type_constructor(
+            types.List.type_id), types.List)
+        self.assertEquals(types.type_id_to_type_constructor(1000), None)
+        names = types.type_id_to_name_dict()
+        self.assertEquals(names[types.Enum.type_id], "enum")
+        self.assertEquals(names[types.List.type_id], "list")
+        self.assertEquals(len(names), 16)
+
+    def test_custom_types(self):
+        class Decimal(types.FieldType):
+            type_id = 1001
+
+        class MyList(types.List):
+            type_id = types.List.type_id
+
+        try:
+            self.assertEquals(types.type_id_to_type_constructor(1001), Decimal)
+            self.assertEquals(types.type_id_to_name_dict()[1001], "decimal")
+            # existing types are only replaced explicitly
+            self.assertEquals(types.type_id_to_type_constructor(
+                types.List.type_id), types.List)
+            types.register_type(MyList)
+            self.assertEquals(types.type_id_to_type_constructor(
+                types.List.type_id), MyList)
+        finally:
+            del types.field_type_registry[1001]
+            types.register_type(types.List)
+
+
+class StructuralEqualityTestCase(TestCase):
+
+    def test_equality(self):
+        from unimodel.model import Unimodel, Field
+        from unimodel.metadata import Metadata
+
+        class A(Unimodel):
+            pass
+
+        class B(Unimodel):
+            pass
+
+        self.assertEquals(types.List(types.Int), types.List(types.Int64()))
+        self.assertEquals(
+            hash(types.Map(types.UTF8, types.Struct(A))),
+            hash(types.Map(types.UTF8, types.Struct(A))))
+        self.assertNotEquals(types.List(types.Int), types.Set(types.Int))
+        self.assertNotEquals(types.List(types.Int), types.List(types.Int32))
+        self.assertNotEquals(
+            types.List(types.Double), types.Array(types.Double))
+        self.assertNotEquals(types.Struct(A), types.Struct(B))
+        self.assertEquals(types.Enum({1: "a"}), types.Enum({1: "a"}))
+        self.assertNotEquals(types.Enum({1: "a"}), types.Enum({1: "b"}))
+        self.assertNotEquals(
+            types.Int(), types.Int(metadata=Metadata()))
+
+    def test_interning(self):
+        from unimodel.model import Field
+        f1 = Field(types.List(types.Int))
+        f2 = Field(types.List(types.Int))
+        self.assertTrue(f1.field_type is f2.field_type)
+        self.assertTrue(f1.field_type.get_validator() is
+                        f2.field_type.get_validator())
+        self.assertTrue(types.Map(types.Int, types.UTF8).type_parameters[0]
+                        is f1.field_type.type_parameters[0])
+
+
+class EnumTestCase(TestCase):
+
+    def test_lookups(self):
+        from unimodel.validation import ValidationException
+        e = types.Enum(dict([(i, "n%s" % i) for i in xrange(1, 300)]))
+        self.assertEquals(e.valid_keys, frozenset(range(1, 300)))
+        self.assertEquals(e.keys_for_names(["n1", "n7"]), [1, 7])
+        self.assertEquals(e.names_for_keys([299, 2]), ["n299", "n2"])
+        self.assertRaises(KeyError, e.keys_for_names, ["n1", "x"])
+        e.validate(5)
+        self.assertRaises(ValidationException, e.validate, 0)
+        keys = range(1, 300)
+        types.List(e).validate(keys)
+        for invalid in (0, 1.0, "n1"):
+            self.assertRaises(
+                ValidationException, types.List(e).validate,
+                keys + [invalid])
+            self.assertRaises(
+                ValidationException, types.List(e).validate, [1, invalid])
+
+    def test_json_lists(self):
+        from unimodel.model import Unimodel, Field
+        from unimodel.backends.json.serializer import JSONSerializer
+        e = types.Enum({1: "one", 2: "two"})
+
+        class F(Unimodel):
+            f = Field(types.List(e))
+
+        serializer = JSONSerializer()
+        data = serializer.serialize(F(f=[1, 2, 2]))
+        self.assertEquals(data, '{"f": ["one", "two", "two"]}')
+        self.assertEquals(serializer.deserialize(F, data), F(f=[1, 2, 2]))
+        self.assertRaises(
+            Exception, serializer.deserialize, F, '{"f": ["one", "three"]}')
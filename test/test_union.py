@@ -0,0 +1,58 @@
+from unittest import TestCase
+from unimodel.model import UnimodelUnion, Field
+from unimodel import types
+from unimodel.backends.json.serializer import JSONSerializer
+from unimodel.backends.thrift.serializer import ThriftSerializer, ThriftProtocol
+from test.fixtures import TestUnion, NodeData, A
+
+
+def make_wide_union_class():
+    attrs = dict([("f%s" % i, Field(types.Int)) for i in xrange(49)])
+    attrs['last'] = Field(types.Struct(A))
+    return type("WideUnion", (UnimodelUnion,), attrs)
+
+WideUnion = make_wide_union_class()
+
+
+class UnionTestCase(TestCase):
+
+    def test_current_field(self):
+        u = TestUnion()
+        self.assertEquals(u.current_field(), None)
+        self.assertEquals(u.current_value(), None)
+        u.f2 = A(f=1)
+        self.assertEquals(u.current_field(), "f2")
+        self.assertEquals(u.current_value(), A(f=1))
+        self.assertEquals(u.current_field_definition().field_name, "f2")
+
+    def test_switch_field(self):
+        u = TestUnion(f1=NodeData(name="a"))
+        u.f2 = A(f=1)
+        self.assertEquals(u.current_field(), "f2")
+        self.assertEquals(u.f1, None)
+        self.assertEquals(list(u.items()), [("f2", A(f=1))])
+        # setting an inactive field to None leaves the active one alone
+        u.f1 = None
+        self.assertEquals(u.f2, A(f=1))
+        u.f2 = None
+        self.assertEquals(u.current_field(), None)
+        self.assertEquals(list(u.items()), [])
+
+    def test_multiple_fields_rejected(self):
+        self.assertRaises(
+            ValueError, TestUnion, f1=NodeData(name="a"), f2=A(f=1))
+
+    def test_serialize(self):
+        u = WideUnion(f30=5)
+        serializer = JSONSerializer()
+        read_data = serializer.deserialize(WideUnion, serializer.serialize(u))
+        self.assertEquals(read_data.current_field(), "f30")
+        self.assertEquals(read_data, u)
+        for protocol_name, protocol_factory in ThriftProtocol.iter():
+            serializer = ThriftSerializer(protocol_factory=protocol_factory)
+            for data in [u, WideUnion(last=A(f=2)), WideUnion()]:
+                read_data = serializer.deserialize(
+                    WideUnion, serializer.serialize(data))
+                self.assertEquals(data, read_data, protocol_name)
+                self.assertEquals(
+                    data.current_field(), read_data.current_field())
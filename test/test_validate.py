@@ -1,6 +1,7 @@
 from unittest import TestCase
 from thrift.Thrift import TType
-from unimodel.backends.thrift.serializer import ThriftProtocol
+from unimodel.backends.json.serializer import JSONSerializer
+from unimodel.backends.thrift.serializer import ThriftProtocol, ThriftSerializer
 from test.helpers import flatten
 from unimodel.model import Unimodel, Field
 from unimodel.metadata import Metadata
@@ -154,6 +155,202 @@ class ValidationTestCase(TestCase):
         self.assertRaises(
             ValidationException, lambda: F(f=[[[{"a": [[3]]}]]]).validate())
 
+    def test_validation_plan(self):
+        class F(Unimodel):
+            a = Field(Int32, required=True)
+            b = Field(UTF8)
+            c = Field(List(Int))
+            d = Field(Double(metadata=Metadata(validators=[])))
+
+        plan = F._validation_plan
+        ids = dict([(f.field_name, f.field_id)
+                    for f in F.get_field_definitions()])
+        self.assertEquals(plan.required_fields, [(ids['a'], 'a')])
+        self.assertEquals(
+            sorted(plan.type_checks.keys()),
+            sorted([ids['b'], ids['d']]))
+        # Int32 values need a range check too
+        self.assertEquals(
+            sorted(plan.validators.keys()), sorted([ids['a'], ids['c']]))
+        self.assertEquals(plan.range_checks.keys(), [ids['a']])
+        self.assertRaises(ValidationException, lambda: F().validate())
+        self.assertRaises(ValidationException, lambda: F(a="1").validate())
+        self.assertRaises(
+            ValidationException, lambda: F(a=1, c=["a"]).validate())
+        F(a=1, b=u"b", c=[1], d=1.0).validate()
+
+    def test_incremental_validation(self):
+        calls = []
+
+        class CountingValidator(object):
+
+            def validate(self, value):
+                calls.append(value)
+
+        class Leaf(Unimodel):
+            x = Field(Int(metadata=Metadata(validators=[CountingValidator()])))
+
+        class Node(Unimodel):
+            leaf = Field(Struct(Leaf))
+            leaves = Field(List(Struct(Leaf)))
+            numbers = Field(List(Int))
+
+        leaf = Leaf(x=1)
+        node = Node(leaf=leaf, leaves=[Leaf(x=2)], numbers=[1])
+        node.validate()
+        self.assertEquals(sorted(calls), [1, 2])
+        # nothing changed, nothing is revalidated
+        node.validate()
+        self.assertEquals(len(calls), 2)
+        # changes in nested structs are picked up
+        leaf.x = 3
+        node.validate()
+        self.assertEquals(calls[2:], [3])
+        leaf.x = "a"
+        self.assertRaises(ValidationException, lambda: node.validate())
+        # the failed validation is retried
+        self.assertRaises(ValidationException, lambda: node.validate())
+        leaf.x = 4
+        node.validate()
+        # containers read from the model may be modified in place
+        node.numbers.append("a")
+        self.assertRaises(ValidationException, lambda: node.validate())
+        node.numbers = [1]
+        node.validate()
+        numbers = node.numbers
+        node.validate()
+        numbers.append("b")
+        node.validate()
+        node.mark_dirty("numbers")
+        self.assertRaises(ValidationException, lambda: node.validate())
+
+    def test_model_validator_reads_nested_struct(self):
+        class NonNegativeChild(object):
+
+            def validate(self, parent):
+                if parent.child.x < 0:
+                    raise ValidationException("neg")
+
+        class Child(Unimodel):
+            x = Field(Int)
+
+        class Parent(Unimodel):
+            child = Field(Struct(Child))
+            metadata = Metadata(validators=[NonNegativeChild()])
+
+        parent = Parent(child=Child(x=1))
+        parent.validate()
+        # only the nested struct changes, the parent's fields don't
+        parent.child.x = -1
+        self.assertRaises(ValidationException, lambda: parent.validate())
+        self.assertRaises(
+            ValidationException, lambda: JSONSerializer().serialize(parent))
+        self.assertRaises(
+            ValidationException, lambda: ThriftSerializer().serialize(parent))
+        parent.child.x = 2
+        parent.validate()
+
+    def test_serializer_reads(self):
+        class Leaf(Unimodel):
+            numbers = Field(List(Int))
+
+        class Node(Unimodel):
+            leaf = Field(Struct(Leaf))
+            names = Field(Map(UTF8, List(Int)))
+
+        node = Node(leaf=Leaf(numbers=[1]), names={u"a": [2]})
+        serializers = [JSONSerializer(), ThriftSerializer(),
+                       ThriftSerializer(engine="compiled"),
+                       ThriftSerializer(accelerated=True)]
+        for serializer in serializers:
+            node.validate()
+            serializer.serialize(node)
+            self.assertEquals(node._dirty, 0)
+            self.assertEquals(node.leaf._dirty, 0)
+        # items() hands out the containers, like reading the fields
+        list(node.leaf.items())
+        self.assertNotEquals(node.leaf._dirty, 0)
+
+    def test_compiled_validators(self):
+        int_list = List(Int)
+        validator = int_list.get_validator()
+        self.assertTrue(int_list.get_validator() is validator)
+        validator([1, 2, 3])
+        try:
+            int_list.validate([1, "a", 3])
+            self.fail("expected ValidationException")
+        except ValidationException as ex:
+            self.assertTrue("element number 1 (value a)" in str(ex))
+        self.assertRaises(ValueTypeException, Enum({1: "one"}).validate, 2)
+        self.assertRaises(ValueTypeException, Tuple(Int, UTF8).validate, (1,))
+        Map(UTF8, List(Int)).validate({"a": [1]})
+        self.assertRaises(
+            ValidationException, Map(UTF8, List(Int)).validate, {"a": ["b"]})
+
+        # types which override validate() are still respected
+        class PositiveInt(Int):
+
+            def validate(self, value):
+                super(PositiveInt, self).validate(value)
+                if value <= 0:
+                    raise ValidationException("not positive")
+
+        class F(Unimodel):
+            f = Field(List(PositiveInt))
+            g = Field(PositiveInt)
+
+        F(f=[1, 2], g=1).validate()
+        self.assertRaises(ValidationException, F(f=[1, 0]).validate)
+        self.assertRaises(ValidationException, F(g=0).validate)
+
+    def test_bulk_element_checks(self):
+        numbers = range(100)
+        List(Int).validate(numbers)
+        Set(Double).validate(set([float(n) for n in numbers]))
+        Map(UTF8, Int).validate(dict([(str(n), n) for n in numbers]))
+        numbers[57] = "x"
+        try:
+            List(Int).validate(numbers)
+            self.fail("expected ValidationException")
+        except ValidationException as ex:
+            self.assertTrue("element number 57 (value x)" in str(ex))
+        self.assertRaises(
+            ValidationException, Map(UTF8, Int).validate,
+            dict([(n, n) for n in xrange(100)]))
+
+    def test_int_ranges(self):
+        Int8().validate(127)
+        Int8().validate(-128)
+        self.assertRaises(ValueTypeException, Int8().validate, 128)
+        self.assertRaises(ValueTypeException, Int16().validate, -2 ** 15 - 1)
+        self.assertRaises(ValueTypeException, Int32().validate, 2 ** 31)
+        self.assertRaises(ValueTypeException, Int64().validate, 2 ** 63)
+        numbers = range(100)
+        List(Int8).validate(numbers)
+        numbers[42] = 1000
+        for collection in (numbers, numbers[:10] + [1000]):
+            try:
+                List(Int8).validate(collection)
+                self.fail("expected ValidationException")
+            except ValidationException as ex:
+                self.assertTrue("(value 1000)" in str(ex))
+        self.assertRaises(
+            ValidationException, Map(Int16, Int).validate, {2 ** 20: 1})
+
+        class F(Unimodel):
+            f = Field(Int32)
+
+        F.from_columns([[1, None, 2]], validate=True)
+        try:
+            F.from_columns([[1, None, 2 ** 40]], validate=True)
+            self.fail("expected ValidationException")
+        except ValidationException as ex:
+            self.assertTrue("row 2" in str(ex))
+        # nothing is written for invalid data
+        from unimodel.backends.thrift.serializer import ThriftSerializer
+        self.assertRaises(
+            ValidationException, ThriftSerializer().serialize, F(f=2 ** 40))
+
     def test_validate_tree_path(self):
         # TODO: update the "validation path", which is just like the
         # json path so it's possible to tell where the failing value
@@ -10,6 +10,21 @@ class Serializer(object):
             model_registry=None):
         self.validate_before_write = validate_before_write
         self.model_registry = model_registry or ModelRegistry()
+        self._implementation_classes = {}
+        self._registry_version = self.model_registry.version
+
+    def get_implementation_class(self, cls):
+        """ Returns the implementation class registered for cls.
+            Lookups are remembered until the registry changes. """
+        if self._registry_version != self.model_registry.version:
+            self._implementation_classes = {}
+            self._registry_version = self.model_registry.version
+        try:
+            return self._implementation_classes[cls]
+        except KeyError:
+            implementation_class = self.model_registry.lookup(cls)
+            self._implementation_classes[cls] = implementation_class
+            return implementation_class
 
     def serialize(self, obj):
         raise NotImplementedError()
@@ -17,6 +32,11 @@ class Serializer(object):
     def deserialize(self, cls, stream):
         raise NotImplementedError()
 
+    def deserialize_into(self, obj, stream):
+        """ Like deserialize, but resets and refills obj instead of
+            creating a new instance. """
+        raise NotImplementedError()
+
 
 class SchemaWriter(object):
     """ A schemawriter gets a SchemaAST object and produces a 
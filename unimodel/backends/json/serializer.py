@@ -82,7 +82,7 @@ class JSONSerializer(Serializer):
         output = {} if output is None else output
         unboxed_struct_fields = self.get_unboxed_struct_fields(
             obj.get_field_definitions())
-        for name, value in obj.items():
+        for name, value in obj._read_items():
             if value is not None:
                 field = obj.get_field_definition(name)
                 with self.context.context(name, field.field_type, value):
@@ -106,6 +106,8 @@ class JSONSerializer(Serializer):
             return self.writeValue(value)
         if isinstance(field_type, types.Struct):
             return self.writeStruct(value)
+        if isinstance(field_type, types.Array):
+            return value.tolist()
         if isinstance(field_type, types.List):
             return self.writeList(field_type, value)
         if isinstance(field_type, types.Map):
@@ -141,8 +143,10 @@ class JSONSerializer(Serializer):
 
     def writeList(self, field_type, collection):
         """ write lists and sets """
-        output = []
         element_type = field_type.type_parameters[0]
+        if isinstance(element_type, types.Enum):
+            return element_type.names_for_keys(collection)
+        output = []
         ix = 0
         for element in collection:
             with self.context.context(ix, element_type, element):
@@ -170,8 +174,19 @@ class JSONSerializer(Serializer):
         with self.context.context("", cls, parsed_json):
             return self.readStruct(cls, parsed_json)
 
-    def get_implementation_class(self, cls):
-        return self.model_registry.lookup(cls)
+    def deserialize_into(self, obj, stream):
+        """ Nested struct instances held by obj are refilled too if
+            the same field is present in the input. """
+        parsed_json = json.loads(stream)
+        with self.context.context("", obj.__class__, parsed_json):
+            return self.readStruct(obj.__class__, parsed_json, obj)
+
+    def get_reusable_struct(self, struct_class, reusable, field_id):
+        obj = reusable.get(field_id, None) if reusable else None
+        if obj is not None and obj.__class__ is \
+                self.get_implementation_class(struct_class):
+            return obj
+        return None
 
     def assert_type(self, value_type, value):
         if not isinstance(value, value_type):
@@ -206,7 +221,11 @@ class JSONSerializer(Serializer):
     def readStruct(self, struct_class, json_obj, target_obj=None):
         self.assert_type(dict, json_obj)
         if target_obj is None:
-            target_obj = self.get_implementation_class(struct_class)()
+            target_obj = self.get_implementation_class(struct_class).acquire()
+            reusable = None
+        else:
+            reusable = target_obj.reset()
+        target_obj._start_update()
         read_fields = []
         unknown_fields = []
         unboxed_struct_fields = self.get_unboxed_struct_fields(
@@ -219,7 +238,14 @@ class JSONSerializer(Serializer):
                 continue
             read_fields.append(key)
             with self.context.context(key, field.field_type, raw_value):
-                parsed_value = self.readField(field.field_type, raw_value)
+                if reusable and field.field_id in reusable:
+                    parsed_value = self.readStruct(
+                        field.field_type.get_python_type(), raw_value,
+                        self.get_reusable_struct(
+                            field.field_type.get_python_type(),
+                            reusable, field.field_id))
+                else:
+                    parsed_value = self.readField(field.field_type, raw_value)
                 target_obj._set_value_by_field_id(field.field_id, parsed_value)
         # Read the subfields of unboxed fields
         for unboxed_struct_field in unboxed_struct_fields:
@@ -227,7 +253,11 @@ class JSONSerializer(Serializer):
                 unboxed_struct_field.field_id,
                 self.readStruct(unboxed_struct_field.field_type.get_python_type(),
                                 dict([(k, v) for k, v in json_obj.items()
-                                      if k not in read_fields])))
+                                      if k not in read_fields]),
+                                self.get_reusable_struct(
+                                    unboxed_struct_field.field_type.get_python_type(),
+                                    reusable, unboxed_struct_field.field_id)))
+        target_obj._finish_update()
         if not self.skip_unknown_fields and len(unknown_fields) > 0:
             raise JSONValidationException(
                 "unknown fields: %s" % ", ".join(unknown_fields),
@@ -253,6 +283,8 @@ class JSONSerializer(Serializer):
             return self.readStruct(type_definition.get_python_type(), value)
         if isinstance(type_definition, types.Map):
             return self.readMap(type_definition, value)
+        if isinstance(type_definition, types.Array):
+            return self.readArray(type_definition, value)
         if isinstance(type_definition, types.List):
             return self.readList(type_definition, value)
         if isinstance(type_definition, types.JSONData):
@@ -302,16 +334,41 @@ class JSONSerializer(Serializer):
         type_definition.validate(result)
         return result
 
+    def readArray(self, type_definition, collection):
+        self.assert_type(list, collection)
+        try:
+            result = type_definition.make_array(collection)
+        except (TypeError, OverflowError, ValueError):
+            # read the elements one by one for a useful error message
+            element_type = type_definition.type_parameters[0]
+            for ix, encoded_element in enumerate(collection):
+                with self.context.context(ix, element_type, encoded_element):
+                    self.readField(element_type, encoded_element)
+            raise JSONValidationException(
+                "Error reading %s as %s" % (
+                    collection, type_definition.get_type_name()),
+                self.context)
+        self.assert_valid(type_definition, result)
+        return result
+
     def readList(self, type_definition, collection):
         self.assert_type(list, collection)
-        result = []
         element_type = type_definition.type_parameters[0]
-        ix = 0
-        for encoded_element in collection:
-            with self.context.context(ix, element_type, encoded_element):
-                element = self.readField(element_type, encoded_element)
-            result.append(element)
-            ix += 1
+        result = None
+        if isinstance(element_type, types.Enum):
+            try:
+                result = element_type.keys_for_names(collection)
+            except (KeyError, TypeError):
+                # read the elements one by one for the error message
+                pass
+        if result is None:
+            result = []
+            ix = 0
+            for encoded_element in collection:
+                with self.context.context(ix, element_type, encoded_element):
+                    element = self.readField(element_type, encoded_element)
+                result.append(element)
+                ix += 1
         result = type_definition.get_python_type()(result)
         type_definition.validate(result)
         return result
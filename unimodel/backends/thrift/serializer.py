@@ -1,14 +1,59 @@
 from thrift.protocol.TBinaryProtocol import TBinaryProtocol
 from thrift.protocol.TCompactProtocol import TCompactProtocol
 from thrift.protocol.TJSONProtocol import TJSONProtocol
+from thrift.protocol.TCompactProtocol import fromZigZag, readVarint
 from thrift.transport import TTransport
+from thrift.Thrift import TType
 from thrift.protocol.TBase import TBase
-from unimodel.model import Unimodel, Field
+from thrift.protocol.TProtocol import TProtocolBase
+from unimodel.model import Unimodel, Field, FieldFactory
+try:
+    from thrift.protocol import fastbinary
+except ImportError:
+    fastbinary = None
 from unimodel.backends.base import Serializer
 from unimodel import types
-from unimodel.util import get_backend_type
+from unimodel.util import get_backend_type, compile_function
 from contextlib import contextmanager
+from itertools import izip
+from cStringIO import StringIO
+import array
 import json
+import struct
+import sys
+import threading
+import weakref
+
+class ThriftSpecCache(object):
+    """ The thrift_specs (and implementation classes) of struct classes
+        for one model registry, emptied when the registry or the fields
+        of a class change.
+        Specs being built are kept in pending until the outermost one
+        is complete, so other threads never see a partial spec. """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.registry_version = None
+        self.fields_version = None
+        self.clear()
+
+    def clear(self):
+        self.specs = {}
+        self.pending = {}
+        self.field_specs = {}
+        self.implementation_classes = {}
+        self.codecs = {}
+        self.accelerated_specs = {}
+
+# model registry -> ThriftSpecCache, shared by every ThriftSpecFactory
+# (and so every ThriftSerializer) using that registry. All registries
+# nothing was registered with look up classes the same way, so they
+# share empty_registry_spec_cache.
+registry_spec_caches = weakref.WeakKeyDictionary()
+empty_registry_spec_cache = ThriftSpecCache()
+
 
 class ThriftSpecFactory(object):
 
@@ -17,31 +62,199 @@ class ThriftSpecFactory(object):
         if self.model_registry is None:
             from unimodel.model import ModelRegistry
             self.model_registry = ModelRegistry()
-        self._spec_cache = {}
-        self.tuple_type_cache = {}
+
+    def get_cache(self):
+        registry = self.model_registry
+        if registry.class_dict:
+            cache = registry_spec_caches.get(registry, None)
+            if cache is None:
+                cache = registry_spec_caches.setdefault(
+                    registry, ThriftSpecCache())
+        else:
+            cache = empty_registry_spec_cache
+        if cache.registry_version != registry.version or \
+                cache.fields_version != FieldFactory.fields_version:
+            with cache.lock:
+                cache.clear()
+                cache.registry_version = registry.version
+                cache.fields_version = FieldFactory.fields_version
+        return cache
+
+    def get_cache_info(self):
+        """ Returns the hit and miss counts and the number of specs
+            of the (process wide) cache used by this factory. """
+        cache = self.get_cache()
+        return {
+            'hits': cache.hits,
+            'misses': cache.misses,
+            'size': len(cache.specs)}
+
+    def get_implementation_class(self, interface_class):
+        implementation_classes = self.get_cache().implementation_classes
+        if interface_class not in implementation_classes:
+            implementation_classes[interface_class] = \
+                self.model_registry.lookup(interface_class)
+        return implementation_classes[interface_class]
 
     def get_spec(self, struct_class):
-        if struct_class not in self._spec_cache:
-            self._spec_cache[
-                struct_class] = self.get_spec_for_struct(struct_class)
-        return self._spec_cache[struct_class]
+        cache = self.get_cache()
+        spec = cache.specs.get(struct_class, None)
+        if spec is not None:
+            cache.hits += 1
+            return spec
+        with cache.lock:
+            spec = cache.specs.get(struct_class, None)
+            if spec is None:
+                # structs referring to themselves find their
+                # spec in pending while it is being built
+                spec = cache.pending.get(struct_class, None)
+            if spec is None:
+                cache.misses += 1
+                spec = self.get_spec_for_struct(struct_class)
+            return spec
+
+    def get_field_spec(self, struct_class, field_id):
+        """ Returns the thrift_spec element of a single field. """
+        field_specs = self.get_cache().field_specs
+        if struct_class not in field_specs:
+            field_specs[struct_class] = dict([
+                (f[0], f) for f in self.get_spec(struct_class)
+                if f is not None])
+        return field_specs[struct_class][field_id]
+
+    def get_codec(self, struct_class):
+        """ Returns the ThriftStructCodec of struct_class, generated
+            on first use. """
+        codecs = self.get_cache().codecs
+        codec = codecs.get(struct_class, None)
+        if codec is None:
+            codec = codecs.setdefault(
+                struct_class,
+                ThriftCodecGenerator(self).make_codec(struct_class))
+        return codec
+
+    def get_accelerated_spec(self, struct_class):
+        """ Returns the thrift_spec fastbinary can encode and decode
+            instances of struct_class with, None if it can't. """
+        cache = self.get_cache()
+        try:
+            return cache.accelerated_specs[struct_class]
+        except KeyError:
+            pass
+        with cache.lock:
+            if struct_class not in cache.accelerated_specs:
+                cache.accelerated_specs[struct_class] = \
+                    self.make_accelerated_spec(struct_class, set())
+            return cache.accelerated_specs[struct_class]
+
+    def make_accelerated_spec(self, struct_class, pending):
+        # fastbinary needs the spec as nested tuples, so the spec of
+        # a recursive struct can't be written down. Frozen models and
+        # unions can't be filled in through setattr.
+        if struct_class in pending or struct_class._immutable or \
+                struct_class.is_union():
+            return None
+        pending = pending | set([struct_class])
+        thrift_spec = []
+        for field_spec in self.get_spec(struct_class):
+            if field_spec is None:
+                thrift_spec.append(None)
+                continue
+            field_id, ttype, name, type_args, default = field_spec
+            field = struct_class._fields_by_id[field_id]
+            if not self.is_accelerated_type(field.field_type):
+                return None
+            type_args = self.make_accelerated_type_args(
+                field.field_type, type_args, pending)
+            if type_args is False:
+                return None
+            if isinstance(field.field_type, types.UTF8):
+                name = ThriftStringAttribute.install(struct_class, field)
+            elif field.field_type.mutable:
+                name = ThriftFieldAttribute.install(struct_class, field)
+            thrift_spec.append(
+                (field_id, ttype, name, type_args, default))
+        return tuple(thrift_spec)
+
+    def is_accelerated_type(self, field_type):
+        # the values of these types need no conversion (UTF8 fields
+        # are converted by ThriftStringAttribute, elements of
+        # containers are never converted)
+        if isinstance(field_type, types.Array):
+            return False
+        if not isinstance(field_type, (
+                types.Int, types.Double, types.Bool, types.UTF8,
+                types.List, types.Map, types.Struct)):
+            return False
+        return all([self.is_accelerated_type(t)
+                    for t in field_type.type_parameters])
+
+    def make_accelerated_type_args(self, field_type, type_args, pending):
+        """ Returns type_args as tuples, False if a nested struct can't
+            be accelerated. """
+        if isinstance(field_type, types.Struct):
+            implementation_class = type_args[0]
+            # fastbinary writes nested structs with the spec of this
+            # class, so the field must not hold instances of other
+            # classes (subclasses, or the interface of a registered
+            # implementation). Structs without fields usually are
+            # interfaces which are subclassed later.
+            if implementation_class is not field_type.get_python_type() or \
+                    not implementation_class._fields_by_id or \
+                    implementation_class.__subclasses__():
+                return False
+            # a struct which can't be accelerated because it leads back
+            # to a pending one is part of a cycle, so it can't be
+            # accelerated on its own either
+            accelerated_specs = self.get_cache().accelerated_specs
+            if implementation_class not in accelerated_specs:
+                accelerated_specs[implementation_class] = \
+                    self.make_accelerated_spec(implementation_class, pending)
+            nested_spec = accelerated_specs[implementation_class]
+            if nested_spec is None:
+                return False
+            return (implementation_class, nested_spec)
+        if type_args is None:
+            return None
+        type_args = list(type_args)
+        for ix, type_parameter in enumerate(field_type.type_parameters):
+            element_type_args = self.make_accelerated_type_args(
+                type_parameter, type_args[2 * ix + 1], pending)
+            if element_type_args is False:
+                return False
+            type_args[2 * ix + 1] = element_type_args
+        return tuple(type_args)
 
     def get_spec_for_struct(self, struct_class):
-        field_list = sorted(
-            struct_class.get_field_definitions(),
-            key=lambda x: x.field_id)
-        thrift_spec = [None]
-        # save the spec to cache so recurisve data structures work.
-        self._spec_cache[struct_class] = thrift_spec
-        for f in field_list:
-            thrift_spec.append(self.get_spec_for_field(f))
+        """ Builds the thrift_spec of struct_class, a list indexed by
+            field id (as the protocols expect). """
+        field_list = struct_class.get_field_definitions()
+        thrift_spec = [None] * (
+            max([f.field_id for f in field_list] + [0]) + 1)
+        cache = self.get_cache()
+        with cache.lock:
+            outermost = not cache.pending
+            # save the spec to cache so recurisve data structures work.
+            cache.pending[struct_class] = thrift_spec
+            try:
+                for f in field_list:
+                    thrift_spec[f.field_id] = self.get_spec_for_field(f)
+            except:
+                if outermost:
+                    cache.pending.clear()
+                raise
+            if outermost:
+                cache.specs.update(cache.pending)
+                cache.pending.clear()
         return thrift_spec
 
     def get_tuple_type_parameter(self, field_type):
-        # tuple_id =
-        #    (implementation_class, self.get_spec(implementation_class))
-        ta = ThriftTupleAdapter(Field(field_type), None)
-        return (ta.tuple_struct_class, self.get_spec(ta.tuple_struct_class))
+        tuple_struct_class = ThriftTupleAdapter.get_tuple_struct_class(
+            field_type)
+        thrift_spec = self.get_spec(tuple_struct_class)
+        return ThriftTupleSpec(
+            tuple_struct_class, thrift_spec, ThriftTupleAdapter(
+                field_type, tuple_struct_class, thrift_spec))
 
 
     def get_spec_type_parameter(self, field_type):
@@ -50,10 +263,16 @@ class ThriftSpecFactory(object):
         # tuples are encoded as structs
         if isinstance(field_type, types.Tuple):
             return self.get_tuple_type_parameter(field_type)
+        # arrays are lists which the protocols encode in bulk
+        if isinstance(field_type, types.Array):
+            return ThriftArraySpec(
+                get_backend_type("thrift", field_type.type_parameters[0].type_id),
+                field_type)
         # structs are a special case
         if isinstance(field_type, types.Struct):
             interface_class = field_type.get_python_type()
-            implementation_class = self.model_registry.lookup(interface_class)
+            implementation_class = self.get_implementation_class(
+                interface_class)
             return (implementation_class, self.get_spec(implementation_class))
         # If there are no type parameters, return None
         if not field_type.type_parameters:
@@ -75,78 +294,601 @@ class ThriftSpecFactory(object):
             self.get_spec_type_parameter(field.field_type),
             field.default,)
 
+class ThriftFieldAttribute(object):
+    """ Attribute through which fastbinary reads and writes a field
+        holding a container. Unlike the field descriptor, reading it
+        does not mark the field dirty. """
+
+    prefix = "_thrift_value"
+
+    def __init__(self, field):
+        self.field = field
+        self.field_id = field.field_id
+        self.default = field.default
+
+    @classmethod
+    def install(cls, struct_class, field):
+        """ Adds the attribute for field to struct_class (replacing the
+            one of an earlier definition of the field), returns its
+            name. """
+        name = "%s_%d" % (cls.prefix, field.field_id)
+        attribute = struct_class.__dict__.get(name)
+        if not isinstance(attribute, cls) or attribute.field is not field:
+            setattr(struct_class, name, cls(field))
+        return name
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        value = obj._get_value_by_field_id(self.field_id)
+        if value is None:
+            return self.default
+        return value
+
+    def __set__(self, obj, value):
+        obj._set_value_by_field_id(self.field_id, value)
+
+
+class ThriftStringAttribute(ThriftFieldAttribute):
+    """ Attribute through which fastbinary reads and writes a UTF8 field
+        encoded, doing what ThriftValueConverter does for the field
+        descriptor. """
+
+    prefix = "_thrift_string"
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        value = obj._get_value_by_field_id(self.field_id)
+        if value is None:
+            value = self.default
+            if value is None:
+                return None
+        if type(value) is types.LazyValue:
+            return value.raw
+        return value.encode('utf-8')
+
+    def __set__(self, obj, value):
+        if type(value) is not unicode:
+            value = types.LazyValue(value, decode_utf8)
+        obj._set_value_by_field_id(self.field_id, value)
+
+
 class ThriftTupleAdapter(object):
-    def __init__(self, field_definition, field_value):
-        self.field_definition = field_definition
-        self.field_value = field_value
-        # This is probably very inefficient,
-        # maybe we can optimize it someday
-        self.tuple_struct_class = self.get_tuple_struct_class()
-
-    def get_tuple_struct_name(self):
-        return "%s_tuple" % (self.field_definition.field_name)
-
-    def get_tuple_struct_class(self):
-        field_dict = {}
-        for ix in xrange(0, len(self.field_definition.field_type.type_parameters)):
-            field_name = "tuple_%s" % ix
-            type_parameter = self.field_definition.field_type.type_parameters[ix]
-            field_dict[field_name] = Field(type_parameter)
-        return type(
-            self.get_tuple_struct_name(),
-            (Unimodel,),
-            field_dict)
-
-    def write(self, protocol):
-        obj = self.tuple_struct_class()
-        for ix in xrange(0, len(self.field_value)):
-            obj["tuple_%s" % ix] = self.field_value[ix]
-        return obj.write(protocol)
+    """ Tuples are encoded as structs with a tuple_<index> field for
+        each element. The adapter of a Tuple type writes and reads the
+        elements of this struct directly, converting them like
+        ThriftValueConverter converts the fields of a model. """
+
+    # Tuple field type -> the Unimodel class describing its struct,
+    # shared by all registries.
+    tuple_struct_classes = {}
+
+    def __init__(self, field_type, tuple_struct_class, thrift_spec):
+        self.field_type = field_type
+        self.tuple_struct_class = tuple_struct_class
+        self.struct_name = tuple_struct_class.__name__
+        element_fields = sorted(
+            tuple_struct_class.get_field_definitions(),
+            key=lambda f: f.field_id)
+        self.element_specs = [
+            thrift_spec[f.field_id] for f in element_fields]
+        conversions = [
+            get_value_conversion(f.field_type) or (None, None)
+            for f in element_fields]
+        self.to_internal_functions = [c[0] for c in conversions]
+        self.from_internal_functions = [c[1] for c in conversions]
 
     @classmethod
-    def to_tuple(cls, tuple_struct_instance):
-        elements = []
-        for f in sorted(tuple_struct_instance.get_field_definitions(), key=lambda x: x.field_id):
-            elements.append(tuple_struct_instance[f.field_name])
+    def get_tuple_struct_class(cls, field_type):
+        tuple_struct_class = cls.tuple_struct_classes.get(field_type, None)
+        if tuple_struct_class is None:
+            field_dict = {}
+            for ix, type_parameter in enumerate(field_type.type_parameters):
+                field_dict["tuple_%s" % ix] = Field(
+                    type_parameter, field_id=ix + 1)
+            tuple_struct_class = cls.tuple_struct_classes.setdefault(
+                field_type, type("tuple_struct", (Unimodel,), field_dict))
+        return tuple_struct_class
+
+    def write(self, protocol, value):
+        protocol.writeStructBegin(self.struct_name)
+        for field_spec, convert, element in izip(
+                self.element_specs, self.from_internal_functions, value):
+            if element is None:
+                continue
+            if convert is not None:
+                element = convert(element)
+            field_id, ttype, name, spec, default = field_spec
+            protocol.writeFieldBegin(name, ttype, field_id)
+            protocol.writeFieldByTType(ttype, element, spec)
+            protocol.writeFieldEnd()
+        protocol.writeFieldStop()
+        protocol.writeStructEnd()
+
+    def read(self, protocol):
+        elements = [None] * len(self.element_specs)
+        protocol.readStructBegin()
+        while True:
+            (name, ttype, field_id) = protocol.readFieldBegin()
+            if ttype == TType.STOP:
+                break
+            ix = field_id - 1
+            if 0 <= ix < len(elements) and \
+                    ttype == self.element_specs[ix][1]:
+                element = protocol.readFieldByTType(
+                    ttype, self.element_specs[ix][3])
+                convert = self.to_internal_functions[ix]
+                if convert is not None:
+                    element = convert(element)
+                    if type(element) is types.LazyValue:
+                        element = element.get()
+                elements[ix] = element
+            else:
+                protocol.skip(ttype)
+            protocol.readFieldEnd()
+        protocol.readStructEnd()
         return tuple(elements)
 
+
+class ThriftTupleSpec(tuple):
+    """ The thrift_spec type parameter of Tuple fields: the tuple struct
+        class and its thrift_spec like that of Struct fields, with the
+        adapter the protocols read and write tuples with. """
+
+    def __new__(cls, tuple_struct_class, thrift_spec, adapter):
+        spec = tuple.__new__(cls, (tuple_struct_class, thrift_spec))
+        spec.adapter = adapter
+        return spec
+
+class ThriftArraySpec(tuple):
+    """ The thrift_spec type parameter of Array fields. The protocols
+        see a regular list spec, but can check for this class to encode
+        and decode the elements in bulk. """
+
+    def __new__(cls, element_ttype, array_type):
+        spec = tuple.__new__(cls, (element_ttype, None))
+        spec.array_type = array_type
+        return spec
+
+# Thrift types encoded as zigzag varints by the compact protocol
+# -> their width in bits.
+VARINT_BITS = {TType.I16: 16, TType.I32: 32, TType.I64: 64}
+
+# The binary encoding of all other numbers is the big-endian
+# struct format below.
+FIXED_WIDTH_FORMATS = {
+    TType.BYTE: '!b', TType.I16: '!h', TType.I32: '!i',
+    TType.I64: '!q', TType.DOUBLE: '!d'}
+
+
+class ThriftArrayCodec(object):
+    """ Writes and reads Array values in one go. varint_ttypes are the
+        element types the protocol encodes as varints, the rest are
+        fixed width big-endian numbers. """
+
+    def __init__(self, varint_ttypes=()):
+        self.varint_ttypes = varint_ttypes
+
+    def write(self, protocol, value, spec):
+        ttype = spec[0]
+        protocol.writeListBegin(ttype, len(value))
+        if ttype in self.varint_ttypes:
+            protocol.trans.write(self.encode_varints(value, VARINT_BITS[ttype]))
+        else:
+            protocol.trans.write(self.encode_fixed_width(value))
+        protocol.writeListEnd()
+
+    def read(self, protocol, spec):
+        ttype, size = protocol.readListBegin()
+        if ttype in self.varint_ttypes:
+            value = spec.array_type.make_array(
+                self.decode_varints(
+                    protocol.trans, size, VARINT_BITS[ttype]))
+        else:
+            value = self.decode_fixed_width(
+                protocol.trans.readAll(
+                    size * struct.calcsize(FIXED_WIDTH_FORMATS[ttype])),
+                spec.array_type)
+        protocol.readListEnd()
+        return value
+
+    def encode_fixed_width(self, value):
+        if not isinstance(value, array.array):
+            # numpy
+            return value.astype(value.dtype.newbyteorder('>')).tostring()
+        if sys.byteorder == 'little' and value.itemsize > 1:
+            value = value[:]
+            value.byteswap()
+        return value.tostring()
+
+    def decode_fixed_width(self, data, array_type):
+        if array_type.use_numpy:
+            import numpy
+            dtype = numpy.dtype(array_type.typecode)
+            return numpy.frombuffer(
+                data, dtype=dtype.newbyteorder('>')).astype(dtype)
+        value = array.array(array_type.typecode)
+        value.fromstring(data)
+        if sys.byteorder == 'little' and value.itemsize > 1:
+            value.byteswap()
+        return value
+
+    def encode_varints(self, value, bits):
+        if not isinstance(value, array.array):
+            # numpy scalars would overflow when shifted
+            value = value.tolist()
+        out = bytearray()
+        shift = bits - 1
+        for n in value:
+            n = (n << 1) ^ (n >> shift)
+            while n & ~0x7f:
+                out.append((n & 0x7f) | 0x80)
+                n >>= 7
+            out.append(n)
+        return bytes(out)
+
+    def decode_varints(self, trans, count, bits):
+        buf = getattr(trans, '_buffer', None)
+        if buf is None:
+            return [fromZigZag(readVarint(trans)) for i in xrange(count)]
+        # Decode straight from the contents of memory buffers instead
+        # of reading them byte by byte. Only the bytes the count
+        # varints can take up are read, not the rest of the message.
+        start = buf.tell()
+        data = bytearray(buf.read(count * ((bits + 6) // 7)))
+        pos = 0
+        values = []
+        append = values.append
+        try:
+            for i in xrange(count):
+                b = data[pos]
+                pos += 1
+                n = b & 0x7f
+                shift = 7
+                while b & 0x80:
+                    b = data[pos]
+                    pos += 1
+                    n |= (b & 0x7f) << shift
+                    shift += 7
+                append((n >> 1) ^ -(n & 1))
+        except IndexError:
+            raise EOFError()
+        buf.seek(start + pos)
+        return values
+
+
+def decode_utf8(value):
+    return value.decode('utf-8')
+
+
+def utf8_to_internal(value):
+    # TODO: not python3 friendly
+    if type(value) is unicode:
+        return value
+    # decoded when the field is first read
+    return types.LazyValue(value, decode_utf8)
+
+
+def utf8_from_internal(value):
+    if type(value) is types.LazyValue:
+        return value.raw
+    return value.encode('utf-8')
+
+
+def bigint_to_internal(value):
+    if value is None:
+        value = 0
+    return long(value)
+
+
+def bigint_from_internal(value):
+    return None if value is None else str(value)
+
+
+def json_to_internal(value):
+    # decoded when the field is first read
+    return types.LazyValue(value, json.loads)
+
+
+def json_from_internal(value):
+    if type(value) is types.LazyValue:
+        # never read, write the original text
+        return value.raw
+    return json.dumps(value)
+
+# field type class -> (to_internal, from_internal) functions converting
+# the values of its fields
+VALUE_CONVERSIONS = [
+    (types.UTF8, (utf8_to_internal, utf8_from_internal)),
+    (types.BigInt, (bigint_to_internal, bigint_from_internal)),
+    (types.JSONData, (json_to_internal, json_from_internal))]
+
+
+def get_value_conversion(field_type):
+    for type_class, conversion in VALUE_CONVERSIONS:
+        if isinstance(field_type, type_class):
+            return conversion
+    return None
+
+
 class ThriftValueConverter(object):
-    
+    """ The value converter set on instances of a struct class while
+        they are read or written. The conversion function of each field
+        is looked up once, when the converter of the class is created
+        by get(). """
+
+    def __init__(self, struct_class):
+        self.fields_version = FieldFactory.fields_version
+        # field_id -> conversion function, for fields which need it
+        self.to_internal_functions = {}
+        self.from_internal_functions = {}
+        for field in struct_class.get_field_definitions():
+            conversion = get_value_conversion(field.field_type)
+            if conversion is not None:
+                self.to_internal_functions[field.field_id] = conversion[0]
+                self.from_internal_functions[field.field_id] = conversion[1]
+        self.needs_conversion = bool(self.to_internal_functions)
+
+    @classmethod
+    def get(cls, struct_class):
+        """ Returns the converter of struct_class, which is kept on the
+            class (not inherited by subclasses, which may add fields)
+            until the fields of a class change. """
+        converter = struct_class.__dict__.get('_thrift_value_converter', None)
+        if converter is None or \
+                converter.fields_version != FieldFactory.fields_version:
+            converter = cls(struct_class)
+            struct_class._thrift_value_converter = converter
+        return converter
+
     def to_internal(self, field_definition, field_value):
-        if isinstance(field_definition.field_type, types.UTF8):
-            # TODO: not python3 friendly
-            if type(field_value) == unicode:
-                pass
-            else:
-                field_value = field_value.decode('utf-8')
-        if isinstance(field_definition.field_type, types.BigInt):
-            if field_value is None:
-                field_value = 0
-            field_value = long(field_value)
-        if isinstance(field_definition.field_type, types.JSONData):
-            field_value = json.loads(field_value)
-        if isinstance(field_definition.field_type, types.Tuple):
-            field_value = ThriftTupleAdapter.to_tuple(field_value)
-        return field_value
+        convert = self.to_internal_functions.get(
+            field_definition.field_id, None)
+        if convert is None:
+            return field_value
+        return convert(field_value)
 
     def from_internal(self, field_definition, field_value):
-        if isinstance(field_definition.field_type, types.UTF8):
-            field_value = field_value.encode('utf-8')
-        if isinstance(field_definition.field_type, types.BigInt):
-            field_value = None if field_value is None else str(field_value)
-        if isinstance(field_definition.field_type, types.JSONData):
-            field_value = json.dumps(field_value)
-        if isinstance(field_definition.field_type, types.Tuple):
-            field_value = ThriftTupleAdapter(field_definition, field_value)
-        return field_value
+        convert = self.from_internal_functions.get(
+            field_definition.field_id, None)
+        if convert is None:
+            return field_value
+        return convert(field_value)
 
 
-def make_protocol_factory(protocol_class):
+class ThriftStructCodec(object):
+    """ The generated write(protocol, obj) and read(protocol, obj)
+        functions of a struct class. """
+
+    def __init__(self, write, read, source):
+        self.write = write
+        self.read = read
+        self.source = source
+
+
+class ThriftCodecGenerator(object):
+    """ Generates the python source of a ThriftStructCodec for the
+        'compiled' engine of ThriftSerializer. The generated functions
+        read and write _model_data directly and call the protocol's
+        read / write methods for each field with no spec interpretation,
+        converting values like ThriftValueConverter does. Lists, sets
+        and maps of simple types, and tuples (when writing) are written
+        out inline. Nested structs still go through their own read() /
+        write() (so subclasses, unions and frozen models behave as with
+        the spec engine), arrays and containers of containers are passed
+        on to the protocol with their thrift_spec. The output is the
+        same as that of the spec engine. """
+
+    def __init__(self, spec_factory):
+        self.spec_factory = spec_factory
+        # globals of the code being generated
+        self.namespace = None
+
+    def make_codec(self, struct_class):
+        field_specs = [
+            f for f in self.spec_factory.get_spec(struct_class)
+            if f is not None]
+        self.namespace = namespace = {
+            '__LazyValue': types.LazyValue,
+            '__decode_utf8': decode_utf8,
+            '__json_loads': json.loads,
+            '__json_dumps': json.dumps}
+        for field_spec in field_specs:
+            field_id = field_spec[0]
+            namespace['__spec_%d' % field_id] = field_spec[3]
+            namespace['__default_%d' % field_id] = field_spec[4]
+        source = "\n".join(
+            self.make_write(struct_class, field_specs) + [""] +
+            self.make_read(struct_class, field_specs))
+        filename = "<unimodel:%s.thrift_codec>" % struct_class.__name__
+        return ThriftStructCodec(
+            compile_function(source, "write", namespace, filename),
+            compile_function(source, "read", namespace, filename),
+            source)
+
+    def storage_expression(self, struct_class, field_id):
+        if struct_class._compact_storage:
+            return "__data[%d]" % struct_class._field_index[field_id]
+        return "__data.get(%d)" % field_id
+
+    def make_write(self, struct_class, field_specs):
+        lines = [
+            "def write(__prot, __obj):",
+            "    __data = __obj._model_data",
+            "    __prot.writeStructBegin(%r)" % struct_class.__name__]
+        for field_id, ttype, name, spec, default in field_specs:
+            field = struct_class._fields_by_id[field_id]
+            lines.append("    __v = %s" % self.storage_expression(
+                struct_class, field_id))
+            # only the active field of a union is written, defaults
+            # of the other fields are not
+            if default is not None and not struct_class.is_union():
+                lines.extend([
+                    "    if __v is None:",
+                    "        __v = __default_%d" % field_id])
+            lines.append("    if __v is not None:")
+            body = self.write_field(
+                field.field_type, field_id, ttype, name, spec,
+                "__v", "__spec_%d" % field_id)
+            lines.extend(["        " + line for line in body])
+        lines.extend([
+            "    __prot.writeFieldStop()",
+            "    __prot.writeStructEnd()"])
+        return lines
+
+    def write_field(self, field_type, field_id, ttype, name, spec,
+                    var, spec_name):
+        """ Writes the value in var, spec is put in the namespace of the
+            generated code as spec_name if it is needed. """
+        if isinstance(field_type, types.Tuple):
+            value_lines = self.write_tuple(
+                field_type, spec, var, spec_name)
+        else:
+            self.namespace[spec_name] = spec
+            value_lines = self.write_value(ttype, spec, var, spec_name)
+        return (self.convert_for_write(field_type, var) +
+                ["__prot.writeFieldBegin(%r, %d, %d)" % (
+                    name, ttype, field_id)] +
+                value_lines +
+                ["__prot.writeFieldEnd()"])
+
+    def write_tuple(self, field_type, tuple_spec, var, spec_name):
+        """ Writes the tuple in var like ThriftTupleAdapter does: as a
+            struct with a tuple_<index> field for each element. """
+        lines = [
+            "__prot.writeStructBegin(%r)" % tuple_spec.adapter.struct_name,
+            "%s_len = len(%s)" % (var, var)]
+        for ix, element_type in enumerate(field_type.type_parameters):
+            field_id, ttype, name, spec, default = tuple_spec[1][ix + 1]
+            element_var = "%s_%d" % (var, ix)
+            lines.extend([
+                "%s = %s[%d] if %s_len > %d else None" % (
+                    element_var, var, ix, var, ix),
+                "if %s is not None:" % element_var])
+            lines.extend(["    " + line for line in self.write_field(
+                element_type, field_id, ttype, name, spec, element_var,
+                "%s_%d" % (spec_name, field_id))])
+        lines.extend([
+            "__prot.writeFieldStop()",
+            "__prot.writeStructEnd()"])
+        return lines
+
+    def convert_for_write(self, field_type, var):
+        if isinstance(field_type, (types.UTF8, types.JSONData)):
+            encode = ("%s = %s.encode('utf-8')"
+                      if isinstance(field_type, types.UTF8)
+                      else "%s = __json_dumps(%s)")
+            return [
+                "if type(%s) is __LazyValue:" % var,
+                "    %s = %s.raw" % (var, var),
+                "else:",
+                "    " + encode % (var, var)]
+        if isinstance(field_type, types.BigInt):
+            return ["%s = str(%s)" % (var, var)]
+        return []
+
+    def write_value(self, ttype, spec, var, spec_name):
+        handlers = TProtocolBase._TTYPE_HANDLERS
+        if not handlers[ttype][2]:
+            return ["__prot.%s(%s)" % (handlers[ttype][1], var)]
+        if ttype == TType.STRUCT:
+            return ["%s.write(__prot)" % var]
+        if ttype in (TType.LIST, TType.SET) and spec[1] is None and \
+                not isinstance(spec, ThriftArraySpec):
+            kind = "List" if ttype == TType.LIST else "Set"
+            return [
+                "__prot.write%sBegin(%d, len(%s))" % (kind, spec[0], var),
+                "__w = __prot.%s" % handlers[spec[0]][1],
+                "for __e in %s:" % var,
+                "    __w(__e)",
+                "__prot.write%sEnd()" % kind]
+        if ttype == TType.MAP and spec[1] is None and spec[3] is None:
+            return [
+                "__prot.writeMapBegin(%d, %d, len(%s))" % (
+                    spec[0], spec[2], var),
+                "__wk = __prot.%s" % handlers[spec[0]][1],
+                "__wv = __prot.%s" % handlers[spec[2]][1],
+                "for __k, __e in %s.iteritems():" % var,
+                "    __wk(__k)",
+                "    __wv(__e)",
+                "__prot.writeMapEnd()"]
+        return ["__prot.%s(%s, %s)" % (handlers[ttype][1], var, spec_name)]
+
+    def make_read(self, struct_class, field_specs):
+        lines = [
+            "def read(__prot, __obj):",
+            "    __data = __obj._model_data",
+            "    __prot.readStructBegin()",
+            "    while True:",
+            "        __fname, __ftype, __fid = __prot.readFieldBegin()",
+            "        if __ftype == %d:" % TType.STOP,
+            "            break"]
+        for field_id, ttype, name, spec, default in field_specs:
+            field_type = struct_class._fields_by_id[field_id].field_type
+            lines.append("        elif __fid == %d and __ftype == %d:" % (
+                field_id, ttype))
+            body = self.read_value(ttype, spec, field_id)
+            body.extend(self.convert_for_read(field_type))
+            if struct_class.is_union():
+                body.append(
+                    "__obj._set_value_by_field_id(%d, __v)" % field_id)
+            elif struct_class._compact_storage:
+                body.append("__data[%d] = __v" %
+                            struct_class._field_index[field_id])
+            else:
+                body.append("__data[%d] = __v" % field_id)
+            lines.extend(["            " + line for line in body])
+        lines.extend([
+            "        else:",
+            "            __prot.skip(__ftype)",
+            "        __prot.readFieldEnd()",
+            "    __prot.readStructEnd()",
+            # as if every field had been set through its descriptor
+            "    __obj._dirty = -1"])
+        return lines
 
-    conv = ThriftValueConverter()
+    def read_value(self, ttype, spec, field_id):
+        handlers = TProtocolBase._TTYPE_HANDLERS
+        if not handlers[ttype][2]:
+            return ["__v = __prot.%s()" % handlers[ttype][0]]
+        if ttype in (TType.LIST, TType.SET) and spec[1] is None and \
+                not isinstance(spec, ThriftArraySpec):
+            kind = "List" if ttype == TType.LIST else "Set"
+            return [
+                "__etype, __size = __prot.read%sBegin()" % kind,
+                "__r = __prot.%s" % handlers[spec[0]][0],
+                "__v = %s[__r() for __i in xrange(__size)]%s" % (
+                    ("", "") if ttype == TType.LIST else ("set(", ")")),
+                "__prot.read%sEnd()" % kind]
+        if ttype == TType.MAP and spec[1] is None and spec[3] is None:
+            return [
+                "__ktype, __vtype, __size = __prot.readMapBegin()",
+                "__rk = __prot.%s" % handlers[spec[0]][0],
+                "__rv = __prot.%s" % handlers[spec[2]][0],
+                "__v = {}",
+                "for __i in xrange(__size):",
+                "    __k = __rk()",
+                "    __v[__k] = __rv()",
+                "__prot.readMapEnd()"]
+        return ["__v = __prot.%s(__spec_%d)" % (handlers[ttype][0], field_id)]
+
+    def convert_for_read(self, field_type):
+        if isinstance(field_type, types.UTF8):
+            return [
+                "if type(__v) is not unicode:",
+                "    __v = __LazyValue(__v, __decode_utf8)"]
+        if isinstance(field_type, types.BigInt):
+            return ["__v = long(__v)"]
+        if isinstance(field_type, types.JSONData):
+            return ["__v = __LazyValue(__v, __json_loads)"]
+        return []
+
+
+def make_protocol_factory(protocol_class):
 
     @contextmanager
-    def converter(obj):
+    def converter(obj, conv):
         old_value_converter = getattr(obj, '_value_converter', None)
         try:
             obj._set_value_converter(conv)
@@ -156,18 +898,79 @@ def make_protocol_factory(protocol_class):
         finally:
             obj._set_value_converter(old_value_converter)
     
+    if issubclass(protocol_class, TBinaryProtocol):
+        array_codec = ThriftArrayCodec()
+    elif issubclass(protocol_class, TCompactProtocol):
+        array_codec = ThriftArrayCodec(varint_ttypes=VARINT_BITS)
+    else:
+        array_codec = None
+
     # invoke converter when reading / writing fields
     class Protocol(protocol_class):
 
         def writeStruct(self, obj, thrift_spec):
-            with converter(obj):
-                return protocol_class.writeStruct(self, obj, thrift_spec)
+            # the fields are read through their descriptors, which mark
+            # containers dirty, but writing does not change them
+            dirty = obj._dirty
+            conv = ThriftValueConverter.get(obj.__class__)
+            if not conv.needs_conversion:
+                protocol_class.writeStruct(self, obj, thrift_spec)
+            else:
+                with converter(obj, conv):
+                    protocol_class.writeStruct(self, obj, thrift_spec)
+            obj._dirty = dirty
 
         def readStruct(self, obj, thrift_spec):
-            with converter(obj):
+            conv = ThriftValueConverter.get(obj.__class__)
+            if not conv.needs_conversion:
                 return protocol_class.readStruct(self, obj, thrift_spec)
+            with converter(obj, conv):
+                return protocol_class.readStruct(self, obj, thrift_spec)
+
+        # struct class -> instances which can be refilled,
+        # set by ThriftSerializer.deserialize_into
+        reusable_structs = None
+
+        def reuse(self, obj):
+            """ Resets obj, keeping the nested structs it held
+                for readContainerStruct. """
+            for field_id, nested in sorted(obj.reset().items(), reverse=True):
+                self.reusable_structs.setdefault(
+                    nested.__class__, []).append(nested)
+
+        def writeContainerList(self, val, spec):
+            if array_codec is not None and isinstance(spec, ThriftArraySpec):
+                return array_codec.write(self, val, spec)
+            return protocol_class.writeContainerList(self, val, spec)
+
+        def readContainerList(self, spec):
+            if isinstance(spec, ThriftArraySpec):
+                if array_codec is not None:
+                    return array_codec.read(self, spec)
+                return spec.array_type.make_array(
+                    protocol_class.readContainerList(self, spec))
+            return protocol_class.readContainerList(self, spec)
+
+        def writeContainerStruct(self, val, spec):
+            if isinstance(spec, ThriftTupleSpec):
+                return spec.adapter.write(self, val)
+            return protocol_class.writeContainerStruct(self, val, spec)
+
+        def readContainerStruct(self, spec):
+            if isinstance(spec, ThriftTupleSpec):
+                return spec.adapter.read(self)
+            obj_class, obj_spec = spec
+            if self.reusable_structs and self.reusable_structs.get(obj_class):
+                obj = self.reusable_structs[obj_class].pop()
+                self.reuse(obj)
+            else:
+                obj = obj_class.acquire()
+            obj.read(self)
+            return obj
 
     class ProtocolFactory(object):
+      protocol_class = Protocol
+
       def getProtocol(self, trans):
           return Protocol(trans)
 
@@ -209,42 +1012,181 @@ class ThriftProtocol(object):
 default_protocol_factory = ThriftProtocol('binary').factory
 
 
+class ThriftProtocolPool(threading.local):
+    """ The read and write protocols (with their transports) which a
+        ThriftSerializer reuses on a thread. Protocols are returned to
+        the pool only after a complete message, so the pool never holds
+        one with half-written state. """
+
+    def __init__(self):
+        self.write_protocol = None
+        self.read_protocol = None
+
+
 class ThriftSerializer(Serializer):
 
+    # Engines encoding structs: "spec" passes the thrift_spec of each
+    # struct to the protocol, "compiled" uses code generated for each
+    # struct class (see ThriftCodecGenerator). Both produce the same
+    # output.
+    engines = ("spec", "compiled")
+
+    # With accelerated=True (binary protocol only), structs which
+    # fastbinary can handle (see ThriftSpecFactory.get_accelerated_spec)
+    # are encoded and decoded by it, the rest by the engine.
+
+    # Buffers which grew larger than this writing a message are not
+    # kept in the protocol pool.
+    max_pooled_buffer_size = 1 << 20
+
     def __init__(
             self,
             protocol_factory=default_protocol_factory,
+            engine="spec",
+            accelerated=False,
             **kwargs):
         super(ThriftSerializer, self).__init__(**kwargs)
+        if engine not in self.engines:
+            raise ValueError("Unknown thrift engine %r, expecting one of %s" % (
+                engine, ", ".join(self.engines)))
+        if accelerated and not issubclass(
+                getattr(protocol_factory, 'protocol_class', object),
+                TBinaryProtocol):
+            raise ValueError(
+                "Only the binary protocol can be accelerated")
         self.protocol_factory = protocol_factory
+        self.engine = engine
+        self.accelerated = accelerated and fastbinary is not None
         self.spec_factory = ThriftSpecFactory(self.model_registry)
+        self.protocol_pool = ThriftProtocolPool()
 
     def serialize(self, obj):
-        transport = TTransport.TMemoryBuffer()
-        protocol = self.protocol_factory.getProtocol(transport)
-        setattr(protocol, "serializer", self)
+        protocol = self.write_message(obj)
+        value = protocol.trans.getvalue()
+        self.release_write_protocol(protocol)
+        return value
+
+    def serialize_into(self, obj, buffer, offset=0):
+        """ Writes obj into buffer (a bytearray or a writable
+            memoryview) starting at offset. Returns the number of bytes
+            written. Bytearrays are extended as needed, memoryviews must
+            be large enough. """
+        if not isinstance(buffer, (bytearray, memoryview)):
+            raise ValueError(
+                "Expecting a bytearray or memoryview, got %s" % (
+                    type(buffer),))
+        if offset < 0 or offset > len(buffer):
+            raise ValueError("Offset %s is outside of the buffer" % (
+                offset,))
+        protocol = self.write_message(obj)
+        value = protocol.trans.getvalue()
+        self.release_write_protocol(protocol)
+        size = len(value)
+        if offset + size > len(buffer) and not isinstance(buffer, bytearray):
+            raise ValueError(
+                "Buffer too small, %s bytes needed at offset %s" % (
+                    size, offset))
+        buffer[offset:offset + size] = value
+        return size
+
+    def write_message(self, obj):
+        """ Writes obj with a write protocol from the pool of the
+            thread, returns the protocol. """
+        # catch invalid (eg: out of range) values before anything is written
+        if self.validate_before_write:
+            obj.validate()
+        protocol = self.acquire_write_protocol()
+        # if the write fails the protocol is not returned to the pool
         self.write_to_stream(obj, protocol)
-        transport._buffer.seek(0)
-        return transport._buffer.getvalue()
+        return protocol
+
+    def acquire_write_protocol(self):
+        protocol = self.protocol_pool.write_protocol
+        if protocol is None:
+            protocol = self.protocol_factory.getProtocol(
+                TTransport.TMemoryBuffer())
+            protocol.serializer = self
+        else:
+            # a nested serialize() call gets a new protocol
+            self.protocol_pool.write_protocol = None
+        return protocol
+
+    def release_write_protocol(self, protocol):
+        output = protocol.trans._buffer
+        if output.tell() > self.max_pooled_buffer_size:
+            return
+        output.seek(0)
+        output.truncate()
+        self.protocol_pool.write_protocol = protocol
+
+    def get_read_protocol(self, stream):
+        """ Returns a read protocol from the pool of the thread, reading
+            stream (a string or any object with the buffer interface,
+            like a memoryview, which is read in place). """
+        protocol = self.protocol_pool.read_protocol
+        if protocol is None:
+            # a read-only buffer, which fastbinary can read from
+            protocol = self.protocol_factory.getProtocol(
+                TTransport.TMemoryBuffer(stream))
+            protocol.serializer = self
+        else:
+            self.protocol_pool.read_protocol = None
+            protocol.trans._buffer = StringIO(stream)
+        return protocol
+
+    def release_read_protocol(self, protocol):
+        protocol.trans._buffer = None
+        protocol.reusable_structs = None
+        self.protocol_pool.read_protocol = protocol
 
     def deserialize(self, cls, stream):
-        obj = self.model_registry.lookup(cls)()
-        transport = TTransport.TMemoryBuffer()
-        transport._buffer.write(stream)
-        transport._buffer.seek(0)
-        protocol = self.protocol_factory.getProtocol(transport)
-        setattr(protocol, "serializer", self)
-        self.read_from_stream(obj, protocol)
+        obj = self.get_implementation_class(cls).acquire()
+        protocol = self.get_read_protocol(stream)
+        obj.read(protocol)
+        self.release_read_protocol(protocol)
+        return obj
+
+    def deserialize_into(self, obj, stream):
+        """ Nested struct instances held by obj are refilled by
+            nested structs of the same class. """
+        protocol = self.get_read_protocol(stream)
+        protocol.reusable_structs = {}
+        protocol.reuse(obj)
+        obj.read(protocol)
+        self.release_read_protocol(protocol)
         return obj
 
     def write_to_stream(self, obj, protocol):
+        if self.accelerated:
+            spec = self.spec_factory.get_accelerated_spec(obj.__class__)
+            if spec is not None:
+                return protocol.trans.write(
+                    fastbinary.encode_binary(obj, (obj.__class__, spec)))
+        if self.engine == "compiled":
+            return self.spec_factory.get_codec(obj.__class__).write(
+                protocol, obj)
+        if obj.is_union():
+            return self.write_union_to_stream(obj, protocol)
         return protocol.writeStruct(
-            obj,
-            self.spec_factory.get_spec_for_struct(
-                obj.__class__))
+            obj, self.spec_factory.get_spec(obj.__class__))
+
+    def write_union_to_stream(self, obj, protocol):
+        # Only the active field of a union is passed to the protocol.
+        thrift_spec = []
+        if obj._current_field_id is not None:
+            thrift_spec.append(self.spec_factory.get_field_spec(
+                obj.__class__, obj._current_field_id))
+        return protocol.writeStruct(obj, thrift_spec)
 
     def read_from_stream(self, obj, protocol):
+        if self.accelerated and isinstance(
+                protocol.trans, TTransport.CReadableTransport):
+            spec = self.spec_factory.get_accelerated_spec(obj.__class__)
+            if spec is not None:
+                return fastbinary.decode_binary(
+                    obj, protocol.trans, (obj.__class__, spec))
+        if self.engine == "compiled":
+            return self.spec_factory.get_codec(obj.__class__).read(
+                protocol, obj)
         protocol.readStruct(
-            obj,
-            self.spec_factory.get_spec_for_struct(
-                obj.__class__))
+            obj, self.spec_factory.get_spec(obj.__class__))
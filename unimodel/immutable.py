@@ -0,0 +1,53 @@
+""" Immutable versions of the python containers used as field values.
+
+They subclass the mutable containers, so the type checks of List, Set
+and Map fields and the serializers work with them unchanged. """
+
+
+def _immutable(self, *args, **kwargs):
+    raise TypeError("'%s' object is immutable" % self.__class__.__name__)
+
+
+class FrozenList(list):
+
+    __slots__ = ()
+
+    append = extend = insert = pop = remove = reverse = sort = _immutable
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = _immutable
+    __iadd__ = __imul__ = _immutable
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __reduce__(self):
+        return (self.__class__, (list(self),))
+
+
+class FrozenSet(set):
+
+    __slots__ = ()
+
+    add = clear = discard = pop = remove = update = _immutable
+    intersection_update = difference_update = _immutable
+    symmetric_difference_update = _immutable
+    __ior__ = __iand__ = __isub__ = __ixor__ = _immutable
+
+    def __hash__(self):
+        return hash(frozenset(self))
+
+    def __reduce__(self):
+        return (self.__class__, (list(self),))
+
+
+class FrozenDict(dict):
+
+    __slots__ = ()
+
+    clear = pop = popitem = setdefault = update = _immutable
+    __setitem__ = __delitem__ = _immutable
+
+    def __hash__(self):
+        return hash(frozenset(self.iteritems()))
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
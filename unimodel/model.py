@@ -1,10 +1,22 @@
 import sys
 import copy
+import keyword
+import re
+from itertools import izip
 from unimodel.validation import ValidationException
-from unimodel.util import instantiate_if_class
+from unimodel.types import assert_type, make_type, LazyValue
+from unimodel.util import compile_function
+from unimodel.immutable import FrozenList, FrozenSet, FrozenDict
+
+IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
 
 class FieldFactory(object):
 
+    # Incremented when the fields of a class which already had some are
+    # replaced or such a class is subclassed, lets caches of per-class
+    # information (like serializer specs) know they have gone stale.
+    fields_version = 0
+
     def field_dict_to_field_list(self, field_dict):
         # Then, we process the contents of field_dict
         field_list = []
@@ -20,10 +32,41 @@ class FieldFactory(object):
         return field_list
 
     def add_fields(self, cls, fields=None):
+        if cls.__dict__.get('_fields_by_id') or any(
+                getattr(base, '_fields_by_id', None) for base in cls.__bases__):
+            FieldFactory.fields_version += 1
         attrs = self.get_field_definition(cls, fields)
         for attr_name, attr_value in attrs.items():
             if attr_value:  # do not set empty values
                 setattr(cls, attr_name, attr_value)
+        self.add_field_descriptors(cls, attrs)
+        MethodFactory().add_methods(cls)
+
+    def add_field_descriptors(self, cls, attrs):
+        # Reading or writing a field is a single descriptor call,
+        # all other attributes go through the regular lookup.
+        mutable_field_bits = 0
+        for field_name, field in attrs['_fields_by_name'].iteritems():
+            if field.field_type.lazy:
+                descriptor_class = cls._lazy_field_descriptor_class
+            else:
+                descriptor_class = cls._field_descriptor_class
+            index = attrs['_field_index'][field.field_id]
+            mutable = field.field_type.mutable and not cls._immutable
+            if mutable:
+                mutable_field_bits |= 1 << index
+            setattr(cls, field_name, descriptor_class(field, index, mutable))
+        cls._mutable_field_bits = mutable_field_bits
+
+    def get_positional_field_names(self, fields):
+        # Fields can be passed to the constructor as positional
+        # arguments in field id order if their name is a valid
+        # python identifier.
+        return [f.field_name for f in sorted(fields, key=lambda f: f.field_id)
+                if IDENTIFIER_RE.match(f.field_name) and
+                not keyword.iskeyword(f.field_name) and
+                f.field_name not in ('self', 'None', 'True', 'False') and
+                not f.field_name.startswith('__')]
 
     def replace_default_field_ids(self, fields):
         # replace -1 field ids with the next available positive integer
@@ -46,17 +89,121 @@ class FieldFactory(object):
             attributes are:
             _fields_by_id
             _fields_by_name
+            _field_ids (sorted list of field ids)
+            _field_index (dense index of each field id, in field id order)
+            _field_count
+            _positional_field_names
+            _validation_plan
         """
         fields = self.field_dict_to_field_list(field_dict or {})
         self.replace_default_field_ids(fields)
+        field_ids = sorted([field.field_id for field in fields])
         attr_dict = {
             '_fields_by_id': dict(
                 [(field.field_id, field) for field in fields]),
             '_fields_by_name': dict(
-                [(field.field_name, field) for field in fields])}
+                [(field.field_name, field) for field in fields]),
+            '_field_ids': field_ids,
+            '_field_index': dict(
+                [(field_id, ix) for ix, field_id in enumerate(field_ids)]),
+            '_field_count': len(fields),
+            '_positional_field_names': self.get_positional_field_names(
+                fields),
+            '_validation_plan': ValidationPlan(fields)}
         return attr_dict
 
 
+class ValidationPlan(object):
+    """ Everything Unimodel.validate() needs to know about the fields
+        of a class, computed once when the fields are added to it. """
+
+    def __init__(self, fields):
+        fields = sorted(fields, key=lambda f: f.field_id)
+        # field_id -> bit of the field in the _dirty mask of instances
+        self.field_bits = dict(
+            [(f.field_id, 1 << ix) for ix, f in enumerate(fields)])
+        # (field_id, field_name) pairs of required fields
+        self.required_fields = [
+            (f.field_id, f.field_name) for f in fields if f.required]
+        # field_id -> python type for fields which only need a type check
+        self.type_checks = {}
+        # field_id -> validate function for all other fields
+        self.validators = {}
+        # field_id -> (python type, (min, max)) for fields which need a
+        # range check on top of the type check (used for columns)
+        self.range_checks = {}
+        for f in fields:
+            python_type = f.field_type.get_type_check()
+            value_range = f.field_type.get_value_range()
+            if python_type is None or value_range is not None:
+                self.validators[f.field_id] = f.field_type.get_validator()
+            else:
+                self.type_checks[f.field_id] = python_type
+            if python_type is not None and value_range is not None:
+                self.range_checks[f.field_id] = (python_type, value_range)
+        # field_id -> validate function for fields which may hold
+        # structs, these are walked even if the field itself is clean.
+        self.nested_validators = dict([
+            (f.field_id, f.field_type.get_validator())
+            for f in fields if f.field_type.contains_structs()])
+        self.field_names = dict([(f.field_id, f.field_name) for f in fields])
+
+    def validate_columns(self, field_ids, columns, row_count):
+        """ Validates the field values of row_count instances at once.
+            columns[i] is the list of values of the field with id
+            field_ids[i]. """
+        columns_by_id = dict(izip(field_ids, columns))
+        for field_id, field_name in self.required_fields:
+            column = columns_by_id.get(field_id, None)
+            if column is None and row_count > 0:
+                raise ValidationException(
+                    "Required field %s (id %s) not set" %
+                    (field_name, field_id))
+            if column is not None and None in column:
+                raise ValidationException(
+                    "Required field %s (id %s) not set in row %s" %
+                    (field_name, field_id, column.index(None)))
+        for field_id, column in columns_by_id.iteritems():
+            try:
+                self.validate_column(field_id, column)
+            except ValidationException as ex:
+                raise ValidationException(
+                    "Field %s: %s" % (self.field_names[field_id], str(ex)))
+
+    def validate_column(self, field_id, column):
+        python_type, value_range = self.range_checks.get(
+            field_id, (self.type_checks.get(field_id, None), None))
+        if python_type is not None:
+            # check each distinct type once instead of each value
+            for value_type in set(map(type, column)):
+                if value_type is not type(None) and not issubclass(
+                        value_type, python_type):
+                    row = map(type, column).index(value_type)
+                    self.raise_row_exception(
+                        row, lambda: assert_type(python_type, column[row]))
+            if value_range is not None:
+                values = column
+                if None in column:
+                    values = [v for v in column if v is not None]
+                if values and (min(values) < value_range[0] or
+                               max(values) > value_range[1]):
+                    self.validate_column_values(field_id, column)
+            return
+        self.validate_column_values(field_id, column)
+
+    def validate_column_values(self, field_id, column):
+        validator = self.validators[field_id]
+        for row, value in enumerate(column):
+            if value is not None:
+                self.raise_row_exception(row, lambda: validator(value))
+
+    def raise_row_exception(self, row, check):
+        try:
+            check()
+        except ValidationException as ex:
+            raise ValidationException("row %s: %s" % (row, str(ex)))
+
+
 class Field(object):
     _field_creation_counter = 0
 
@@ -69,7 +216,7 @@ class Field(object):
                  metadata=None):
         self.creation_count = Field._field_creation_counter
         Field._field_creation_counter += 1
-        self.field_type = instantiate_if_class(field_type)
+        self.field_type = make_type(field_type)
         self.field_id = field_id
         self.field_name = field_name
         self.required = required
@@ -82,15 +229,331 @@ class Field(object):
 
     def validate(self, value):
         # first, validate the type of the value
-        self.field_type.validate(value)
+        self.field_type.get_validator()(value)
         # then run any potential custom validators on the field
         if self.metadata and self.metadata.validators:
             for validator in self.metadata.validators:
                 validator.validate(value)
 
 
+class FieldDescriptor(object):
+    """ Data descriptor installed on Unimodel classes for each field.
+        Values are stored in the instance's _model_data dictionary
+        keyed by field id. Accessing the descriptor on the class
+        returns the field definition.
+        Setting a field marks it dirty, so the next validate() checks it.
+        So does reading a field holding a mutable container (which the
+        caller may change in place), like items() does. Serializers
+        read values without marking them, see Unimodel._read_items(). """
+
+    def __init__(self, field, index, mutable):
+        self.field = field
+        self.field_id = field.field_id
+        self.index = index
+        self.bit = 1 << index
+        self.mutable = mutable
+        self.default = field.default
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self.field
+        if self.mutable:
+            obj._dirty |= self.bit
+        value = obj._model_data.get(self.field_id, None)
+        if value is None:
+            value = self.default
+        if obj._value_converter is not None and value is not None:
+            value = obj._value_converter.from_internal(self.field, value)
+        return value
+
+    def __set__(self, obj, value):
+        if obj._value_converter is not None:
+            value = obj._value_converter.to_internal(self.field, value)
+        obj._dirty |= self.bit
+        if value is None:
+            obj._model_data.pop(self.field_id, None)
+        else:
+            obj._model_data[self.field_id] = value
+
+    def __delete__(self, obj):
+        obj._dirty |= self.bit
+        obj._model_data.pop(self.field_id, None)
+
+
+class CompactFieldDescriptor(FieldDescriptor):
+    """ Field descriptor for CompactUnimodel classes, where _model_data
+        is a fixed size list indexed by the dense index of the field. """
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self.field
+        if self.mutable:
+            obj._dirty |= self.bit
+        value = obj._model_data[self.index]
+        if value is None:
+            value = self.default
+        if obj._value_converter is not None and value is not None:
+            value = obj._value_converter.from_internal(self.field, value)
+        return value
+
+    def __set__(self, obj, value):
+        if obj._value_converter is not None:
+            value = obj._value_converter.to_internal(self.field, value)
+        obj._dirty |= self.bit
+        obj._model_data[self.index] = value
+
+    def __delete__(self, obj):
+        obj._dirty |= self.bit
+        obj._model_data[self.index] = None
+
+
+class LazyValueDescriptorMixin(object):
+    """ Decodes a LazyValue left by a deserializer on first read, unless
+        a value converter is set (serializers converting the value
+        themselves get the LazyValue). """
+
+    def __get__(self, obj, cls=None):
+        value = super(LazyValueDescriptorMixin, self).__get__(obj, cls)
+        if type(value) is LazyValue and obj._value_converter is None:
+            value = obj._decode_lazy_value(self.field_id, value)
+        return value
+
+
+class LazyFieldDescriptor(FieldDescriptor):
+    """ FieldDescriptor for fields of lazy types. __get__ is written out
+        (rather than using LazyValueDescriptorMixin) as string fields
+        are lazy and reading them is the most common field access. """
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self.field
+        if self.mutable:
+            obj._dirty |= self.bit
+        value = obj._model_data.get(self.field_id, None)
+        if value is None:
+            value = self.default
+        if obj._value_converter is not None:
+            if value is not None:
+                value = obj._value_converter.from_internal(self.field, value)
+        elif type(value) is LazyValue:
+            value = obj._decode_lazy_value(self.field_id, value)
+        return value
+
+
+class LazyCompactFieldDescriptor(CompactFieldDescriptor):
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self.field
+        if self.mutable:
+            obj._dirty |= self.bit
+        value = obj._model_data[self.index]
+        if value is None:
+            value = self.default
+        if obj._value_converter is not None:
+            if value is not None:
+                value = obj._value_converter.from_internal(self.field, value)
+        elif type(value) is LazyValue:
+            value = obj._decode_lazy_value(self.field_id, value)
+        return value
+
+
+def replaceable(method):
+    """ Marks methods of the Unimodel base classes which MethodFactory
+        may replace with methods generated for the fields of a class. """
+    method.replaceable = True
+    return method
+
+
+class MethodFactory(object):
+    """ Generates __init__, __repr__ and items() for a Unimodel class
+        from python source, specialized for its fields and its storage
+        mode. Methods defined by hand on the class or on any of its bases
+        are never replaced.
+        __eq__ is not generated: comparing the whole _model_data (a dict,
+        or a list in field id order for compact storage) in C is faster
+        than any per-field comparison written in python. """
+
+    generated_methods = ['__init__', '__repr__', 'items']
+
+    def add_methods(self, cls):
+        if not getattr(cls, '_fields_by_id', None):
+            return
+        fields = sorted(cls._fields_by_id.values(), key=lambda f: f.field_id)
+        for method_name in self.generated_methods:
+            if not self.is_replaceable(cls, method_name):
+                continue
+            make_method = getattr(
+                self, "make_%s" % method_name.strip('_'))
+            method = make_method(cls, fields)
+            method.replaceable = True
+            setattr(cls, method_name, method)
+
+    def is_replaceable(self, cls, method_name):
+        method = getattr(cls, method_name, None)
+        return getattr(method, 'replaceable', False)
+
+    def compile(self, cls, source, function_name, namespace=None):
+        return compile_function(
+            source,
+            function_name,
+            namespace,
+            "<unimodel:%s.%s>" % (cls.__name__, function_name))
+
+    def value_expression(self, cls, field, data_var):
+        """ Python expression which reads the value of field from
+            the _model_data of an instance held in data_var. """
+        if cls._compact_storage:
+            return "%s[%d]" % (data_var, cls._field_index[field.field_id])
+        return "%s.get(%d)" % (data_var, field.field_id)
+
+    def make_init(self, cls, fields):
+        positional = cls._positional_field_names
+        args = ["self"] + ["%s=None" % name for name in positional]
+        generic_kwargs = ["%s=%s" % (name, name) for name in positional]
+        lines = [
+            "def __init__(%s, **__kwargs):" % ", ".join(args),
+            # Subclasses with a hand written __init__ calling this one
+            # are initialized by the generic code.
+            "    if self.__class__ is not __cls:",
+            "        return __generic_init(self, %s)" % ", ".join(
+                generic_kwargs + ["**__kwargs"])]
+        if cls._compact_storage:
+            values = [None] * cls._field_count
+            for field in fields:
+                if field.field_name in positional:
+                    values[cls._field_index[field.field_id]] = field.field_name
+            lines.append("    self._model_data = [%s]" % ", ".join(
+                [str(v) for v in values]))
+        else:
+            lines.append("    __data = {}")
+            for field in fields:
+                if field.field_name in positional:
+                    lines.append("    if %s is not None:" % field.field_name)
+                    lines.append("        __data[%d] = %s" % (
+                        field.field_id, field.field_name))
+            lines.append("    self._model_data = __data")
+        lines.extend([
+            "    self._value_converter = None",
+            "    self._dirty = -1",
+            "    if __kwargs:",
+            "        self._init_kwargs(__kwargs)"])
+        generic_init = Unimodel.__init__
+        if cls._immutable:
+            lines.append("    self._finish_update()")
+            generic_init = FrozenUnimodel.__init__
+        return self.compile(cls, "\n".join(lines), "__init__", {
+            '__cls': cls,
+            '__generic_init': generic_init.im_func})
+
+    def make_model_data_builder(self, cls, field_ids):
+        """ Returns a function which turns a sequence of values for
+            field_ids into _model_data. """
+        value_names = ["__v%d" % ix for ix in xrange(len(field_ids))]
+        lines = [
+            "def build(__values):",
+            "    try:",
+            "        %s = __values" % ("".join(
+                [name + ", " for name in value_names]) or "[]"),
+            "    except ValueError:",
+            "        raise ValueError('Expecting %s values per row, got %%s'"
+            " %% len(__values))" % len(field_ids)]
+        if cls._compact_storage:
+            values = ["None"] * cls._field_count
+            for field_id, value_name in zip(field_ids, value_names):
+                values[cls._field_index[field_id]] = value_name
+            lines.append("    return [%s]" % ", ".join(values))
+        else:
+            lines.append("    __data = {}")
+            for field_id, value_name in zip(field_ids, value_names):
+                lines.append("    if %s is not None:" % value_name)
+                lines.append("        __data[%d] = %s" % (field_id, value_name))
+            lines.append("    return __data")
+        return self.compile(cls, "\n".join(lines), "build")
+
+    def make_items(self, cls, fields):
+        lines = [
+            "def items(self):",
+            "    __data = self._model_data",
+            "    __items = []"]
+        if cls._mutable_field_bits:
+            lines.append("    self._dirty |= %d" % cls._mutable_field_bits)
+        for field in fields:
+            lines.append(
+                "    __value = %s" % self.value_expression(cls, field, "__data"))
+            if field.field_type.lazy:
+                lines.extend([
+                    "    if type(__value) is __LazyValue:",
+                    "        __value = self._decode_lazy_value(%d, __value)" %
+                    field.field_id])
+            lines.extend([
+                "    if __value is not None:",
+                "        __items.append((%r, __value))" % field.field_name])
+        lines.append("    return iter(__items)")
+        return self.compile(cls, "\n".join(lines), "items", {
+            '__LazyValue': LazyValue})
+
+    def make_repr(self, cls, fields):
+        lines = [
+            "def __repr__(self):",
+            "    __data = self._model_data",
+            "    __values = []"]
+        for field in fields:
+            lines.extend([
+                "    __value = %s" % self.value_expression(cls, field, "__data"),
+                "    if __value is not None:",
+                "        __values.append(%r + repr(__value))" % (
+                    field.field_name + "=")])
+        lines.append(
+            "    return '%s(%s)' % (self.__class__.__name__, "
+            "', '.join(__values))")
+        return self.compile(cls, "\n".join(lines), "__repr__")
+
+
+class UnionFieldDescriptor(FieldDescriptor):
+    """ Field descriptor for UnimodelUnion classes. Goes through the
+        storage methods of the union, which keep track of the active
+        field. """
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self.field
+        if self.mutable:
+            obj._dirty |= self.bit
+        value = None
+        if obj._current_field_id == self.field_id:
+            value = obj._get_value_by_field_id(self.field_id)
+        if value is None:
+            value = self.default
+        if obj._value_converter is not None and value is not None:
+            value = obj._value_converter.from_internal(self.field, value)
+        return value
+
+    def __set__(self, obj, value):
+        if obj._value_converter is not None:
+            value = obj._value_converter.to_internal(self.field, value)
+        obj._set_value_by_field_id(self.field_id, value)
+
+    def __delete__(self, obj):
+        if obj._current_field_id == self.field_id:
+            obj._del_value_by_field_id(self.field_id)
+
+
+class LazyUnionFieldDescriptor(LazyValueDescriptorMixin,
+                               UnionFieldDescriptor):
+    pass
+
+
 class UnimodelMetaclass(type):
 
+    def __new__(mcs, name, bases, dct):
+        # Subclasses of compact models do not get a per-instance __dict__
+        # unless they explicitly ask for one in __slots__.
+        if '__slots__' not in dct and any(
+                getattr(base, '_compact_storage', False) for base in bases):
+            dct['__slots__'] = ()
+        return super(UnimodelMetaclass, mcs).__new__(mcs, name, bases, dct)
+
     def __init__(cls, name, bases, dct):
         super(UnimodelMetaclass, cls).__init__(name, bases, dct)
         field_dict = dict([(k, v)
@@ -110,19 +573,69 @@ class UnimodelMetaclass(type):
 class Unimodel(object):
 
     __metaclass__ = UnimodelMetaclass
+    # Subclasses which do not define __slots__ get a __dict__ as usual.
+    # _dirty is a bit mask (see ValidationPlan.field_bits) of the fields
+    # changed since the last successful validation, -1 if the instance
+    # was never validated.
+    __slots__ = ('_model_data', '_value_converter', '_dirty')
+
+    _field_descriptor_class = FieldDescriptor
+    _lazy_field_descriptor_class = LazyFieldDescriptor
+    _compact_storage = False
+    _immutable = False
+    # slots which are not pickled, they are None after unpickling
+    _transient_slots = ('_value_converter',)
+    # bits of the fields holding mutable containers in the _dirty mask
+    _mutable_field_bits = 0
+    # defaults for classes without fields
+    _fields_by_id = {}
+    _fields_by_name = {}
+    _field_ids = []
+    _field_index = {}
+    _field_count = 0
+    _positional_field_names = []
 
-    def __init__(self, **kwargs):
-        self._model_data = {}
+    @replaceable
+    def __init__(self, *args, **kwargs):
+        self._model_data = self._new_model_data()
         self._value_converter = None
+        self._dirty = -1
+        if len(args) > len(self._positional_field_names):
+            raise TypeError(
+                "%s takes at most %s positional arguments (%s given)" % (
+                    self.__class__.__name__,
+                    len(self._positional_field_names),
+                    len(args)))
+        for field_name, value in zip(self._positional_field_names, args):
+            setattr(self, field_name, value)
+        self._init_kwargs(kwargs)
 
+    def _init_kwargs(self, kwargs):
         for field_name, value in kwargs.iteritems():
             setattr(self, field_name, value)
 
+    @replaceable
     def __repr__(self):
         L = ['%s=%r' % (self._fields_by_id[field_id].field_name, value)
-             for field_id, value in self._model_data.iteritems()]
+             for field_id, value in self._iter_values()]
         return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
 
+    def __getstate__(self):
+        # instances have no __dict__ (unless a subclass adds one), so
+        # pickle has to be told about the slots
+        state = dict(getattr(self, '__dict__', {}))
+        for cls in self.__class__.__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if name not in self._transient_slots and hasattr(self, name):
+                    state[name] = getattr(self, name)
+        return state
+
+    def __setstate__(self, state):
+        for name in self._transient_slots:
+            object.__setattr__(self, name, None)
+        for name, value in state.iteritems():
+            object.__setattr__(self, name, value)
+
     def write(self, protocol):
         """ this method is called by the thrift protocols """
         return protocol.serializer.write_to_stream(self, protocol)
@@ -146,69 +659,58 @@ class Unimodel(object):
         return cls._fields_by_name.values()
 
     def __getitem__(self, field_name):
-        return self._model_data.get(
-            self._field_name_to_field_id(field_name),
-            None)
+        field = self.get_field_definition(field_name)
+        if field.field_type.mutable:
+            self._dirty |= 1 << self._field_index[field.field_id]
+        value = self._get_value_by_field_id(field.field_id)
+        if type(value) is LazyValue:
+            value = self._decode_lazy_value(field.field_id, value)
+        return value
 
     def __setitem__(self, field_name, value):
-        self._model_data[self._field_name_to_field_id(field_name)] = value
+        self._set_value_by_field_id(
+            self._field_name_to_field_id(field_name),
+            value)
 
     def __delitem__(self, field_name):
-        self._model_data.__delitem__(
+        self._del_value_by_field_id(
             self._field_name_to_field_id(field_name))
 
     def __iter__(self):
         return self.iterkeys()
 
+    @replaceable
     def items(self):
-        return iter([(self._fields_by_id[i[0]].field_name, i[1])
-                     for i in self._model_data.items()])
+        # the caller may change containers in place
+        self._dirty |= self._mutable_field_bits
+        return iter([(self._fields_by_id[field_id].field_name, value)
+                     for field_id, value in self._iter_values()])
+
+    def _read_items(self):
+        """ items() for serializers, which only read the values, so
+            they are not marked dirty. """
+        dirty = self._dirty
+        items = self.items()
+        self._dirty = dirty
+        return items
+
+    def _start_update(self):
+        """ Called by deserializers before they fill in the fields. """
+        pass
+
+    def _finish_update(self):
+        """ Called by deserializers after the fields are filled in. """
+        pass
 
     def _set_value_converter(self, conv):
         # This is a huge hack in order to get Thrift to play
         # nicely with some basic things like unicode (and some
         # non-basic things like JSONData fields).
-        # a converter class can be set which __getattribute__
-        # and __setattr__ invoke when passing data to and from
-        # the internal _model_data dictionary.
+        # a converter class can be set which the field descriptors
+        # invoke when passing data to and from the internal
+        # _model_data dictionary.
         self._value_converter = conv
 
-
-    def __getattribute__(self, name):
-        # check in model_data first
-        fields_by_name = object.__getattribute__(self, '_fields_by_name')
-        # Note: In a try ... raise block because reading of _model_data
-        # raises an AttributeError in Unimodel.__init__, when the
-        # attribute is initialized.
-        value_converter = None
-        try:
-            value_converter = object.__getattribute__(self, '_value_converter')
-        except AttributeError:
-            pass
-        try:
-            model_data = object.__getattribute__(self, '_model_data')
-            # If a model field name matches, return its value
-            if name in fields_by_name:
-                field = fields_by_name[name]
-                value = model_data.get(field.field_id, None)
-                if value is None:
-                    value = field.default
-                if value_converter is not None:
-                    value = value_converter.from_internal(field, value)
-                return value
-        except AttributeError:
-            pass
-        return object.__getattribute__(self, name)
-
-    def __setattr__(self, name, value):
-        if hasattr(self, '_model_data') and name in self._fields_by_name:
-            value_converter = getattr(self, '_value_converter', None)
-            if value_converter is not None:
-                value = value_converter.to_internal(self._fields_by_name[name], value)
-            self._model_data[self._fields_by_name[name].field_id] = value
-            return
-        super(Unimodel, self).__setattr__(name, value)
-
     def __eq__(self, other):
         return isinstance(
             other,
@@ -217,27 +719,216 @@ class Unimodel(object):
     def __ne__(self, other):
         return not (self == other)
 
+    # The methods below are the only ones which know how field values
+    # are stored. Unset fields and fields set to None are the same.
+
+    def _new_model_data(self):
+        return {}
+
     def _set_value_by_field_id(self, field_id, value):
-        self._model_data[field_id] = value
+        self._dirty |= 1 << self._field_index[field_id]
+        if value is None:
+            self._model_data.pop(field_id, None)
+        else:
+            self._model_data[field_id] = value
 
     def _get_value_by_field_id(self, field_id):
         return self._model_data.get(field_id, None)
 
+    def _del_value_by_field_id(self, field_id):
+        self._dirty |= 1 << self._field_index[field_id]
+        del self._model_data[field_id]
+
+    def _iter_values(self):
+        """ Returns (field_id, value) pairs of the set fields. Values
+            of lazy types may be a LazyValue. """
+        return self._model_data.iteritems()
+
+    def _decode_lazy_value(self, field_id, value):
+        """ Replaces the LazyValue stored for field_id with the value
+            it decodes to, which the caller may modify. """
+        decoded = value.get()
+        self._set_value_by_field_id(field_id, decoded)
+        return decoded
+
+    def _clear_model_data(self):
+        self._model_data.clear()
+
+    @classmethod
+    def _from_model_data(cls, model_data):
+        """ Creates an instance with the given storage without
+            calling __init__. """
+        obj = cls.__new__(cls)
+        obj._model_data = model_data
+        obj._value_converter = None
+        obj._dirty = -1
+        return obj
+
+    @classmethod
+    def _get_field_ids(cls, field_names):
+        if field_names is None:
+            return cls._field_ids
+        return [cls._fields_by_name[name].field_id for name in field_names]
+
+    @classmethod
+    def from_rows(cls, rows, field_names=None, validate=False):
+        """ Returns a list of instances, one for each row. A row is a
+            sequence of values ordered like field_names, or by field id
+            if field_names is not given. If validate is True, the values
+            are validated column by column before the instances are
+            built. """
+        rows = rows if isinstance(rows, (list, tuple)) else list(rows)
+        field_ids = cls._get_field_ids(field_names)
+        if validate:
+            cls._validate_columns(
+                field_ids, [list(c) for c in izip(*rows)], len(rows))
+        return cls._build_instances(field_ids, rows, validate)
+
+    @classmethod
+    def from_columns(cls, columns, field_names=None, validate=False):
+        """ Returns a list of instances built from columns of values.
+            columns[i] holds the values of the i-th field in field_names
+            (or in field id order if field_names is not given) for every
+            instance. """
+        columns = [c if isinstance(c, list) else list(c) for c in columns]
+        field_ids = cls._get_field_ids(field_names)
+        row_count = len(columns[0]) if columns else 0
+        if any(len(c) != row_count for c in columns):
+            raise ValueError("Columns must have the same length")
+        if validate:
+            cls._validate_columns(field_ids, columns, row_count)
+        return cls._build_instances(field_ids, izip(*columns), validate)
+
+    @classmethod
+    def _validate_columns(cls, field_ids, columns, row_count):
+        if len(columns) not in (0, len(field_ids)):
+            raise ValueError("Expecting %s values per row, got %s" % (
+                len(field_ids), len(columns)))
+        cls._validation_plan.validate_columns(field_ids, columns, row_count)
+
+    @classmethod
+    def _get_model_data_builder(cls, field_ids):
+        """ Returns a function which builds _model_data from a
+            sequence of values for the given field ids. """
+        if '_model_data_builders' not in cls.__dict__:
+            cls._model_data_builders = {}
+        key = tuple(field_ids)
+        if key not in cls._model_data_builders:
+            cls._model_data_builders[key] = \
+                MethodFactory().make_model_data_builder(cls, field_ids)
+        return cls._model_data_builders[key]
+
+    @classmethod
+    def _build_instances(cls, field_ids, rows, validate):
+        build = cls._get_model_data_builder(field_ids)
+        from_model_data = cls._from_model_data
+        instances = [from_model_data(build(values)) for values in rows]
+        if validate:
+            # Model level validators still run on each instance.
+            validators = getattr(getattr(cls, 'metadata', None),
+                                 'validators', None)
+            for obj in instances:
+                for validator in (validators or []):
+                    validator.validate(obj)
+                # validated, like after a successful validate()
+                obj._dirty = 0
+        return instances
+
+    def reset(self):
+        """ Unsets every field, leaving the instance as if it had been
+            created without arguments. Returns a dict of the nested
+            (mutable) struct instances it held, keyed by field id, which
+            deserializers refill instead of allocating new ones. """
+        nested = dict([(field_id, value)
+                       for field_id, value in self._iter_values()
+                       if isinstance(value, Unimodel) and
+                       not value._immutable])
+        self._clear_model_data()
+        self._dirty = -1
+        return nested
+
+    # Free-list of released instances, see set_pool_size().
+    _pool_size = 0
+    _free_list = None
+
+    @classmethod
+    def set_pool_size(cls, pool_size):
+        """ Keep up to pool_size released instances of this class
+            (but not its subclasses) for reuse by acquire(). A pool
+            size of 0 disables pooling. """
+        cls._pool_size = pool_size
+        cls._free_list = [] if pool_size else None
+
+    @classmethod
+    def acquire(cls):
+        """ Returns an empty instance, taken from the class' pool if
+            there is one available. Deserializers use this to
+            create instances. """
+        free_list = cls.__dict__.get('_free_list', None)
+        if free_list:
+            return free_list.pop()
+        return cls()
+
+    def release(self):
+        """ Returns the instance to its class' pool (if pooling is
+            enabled and the pool is not full). The instance is reset
+            and must not be used by the caller afterwards. """
+        free_list = self.__class__.__dict__.get('_free_list', None)
+        if free_list is not None and len(free_list) < self._pool_size:
+            self.reset()
+            free_list.append(self)
+
+    def mark_dirty(self, *field_names):
+        """ Makes the next validate() check the given fields (all fields
+            if none are given) again. Only needed if a value was changed
+            without going through the model, eg. an element of a list
+            obtained before the last validation was modified. """
+        if not field_names:
+            self._dirty = -1
+        for field_name in field_names:
+            self._dirty |= 1 << self._field_index[
+                self._field_name_to_field_id(field_name)]
+
     def validate(self):
-        # check to make sure required fields are set
-        for k, v in self._fields_by_name.iteritems():
-            if self._model_data.get(v.field_id, None) is None:
-                if v.required:
+        """ Validates the fields changed since the last successful
+            validation. Fields holding structs are walked even if
+            unchanged, but nested structs only check their own
+            changed fields. """
+        dirty = self._dirty
+        plan = self._validation_plan
+        nested_validators = plan.nested_validators
+        if not dirty and not nested_validators:
+            return
+        if dirty:
+            # check to make sure required fields are set
+            for field_id, field_name in plan.required_fields:
+                if self._get_value_by_field_id(field_id) is None:
                     raise ValidationException(
                         "Required field %s (id %s) not set" %
-                        (k, v.field_id))
-            else:
-                # Run any field validators
-                v.field_type.validate(self._model_data.get(v.field_id, None))
-        # Run the validator for the model itself (if it is set)
-        if hasattr(self, 'metadata') and hasattr(self.metadata, 'validators'):
+                        (field_name, field_id))
+        # Run any field validators on the fields which are set
+        type_checks = plan.type_checks
+        field_bits = plan.field_bits
+        for field_id, value in self._iter_values():
+            if dirty & field_bits[field_id]:
+                python_type = type_checks.get(field_id, None)
+                if python_type is None:
+                    plan.validators[field_id](value)
+                elif not isinstance(value, python_type):
+                    # LazyValues left by deserializers hold values of
+                    # the right type, they are not decoded just to
+                    # check that.
+                    if type(value) is not LazyValue:
+                        assert_type(python_type, value)
+            elif field_id in nested_validators:
+                nested_validators[field_id](value)
+        # Run the validator for the model itself (if it is set). It may
+        # read nested structs, so it runs even if no own field changed.
+        if hasattr(self, 'metadata') and hasattr(
+                self.metadata, 'validators'):
             for validator in (self.metadata.validators or []):
                 validator.validate(self)
+        self._dirty = 0
 
     @classmethod
     def get_name(cls):
@@ -252,30 +943,268 @@ class Unimodel(object):
         return False
 
 
+class FrozenInstanceError(AttributeError):
+    pass
+
+
+def freeze_value(value):
+    """ Returns an immutable equivalent of a field value. """
+    if isinstance(value, Unimodel):
+        if not value._immutable:
+            raise TypeError(
+                "Frozen models can only hold frozen structs, got %s" %
+                value.__class__.__name__)
+        return value
+    if isinstance(value, (FrozenList, FrozenSet, FrozenDict)):
+        return value
+    if type(value) is LazyValue:
+        # frozen models decode everything up front
+        return freeze_value(value.get())
+    if isinstance(value, list):
+        return FrozenList([freeze_value(v) for v in value])
+    if isinstance(value, set):
+        return FrozenSet([freeze_value(v) for v in value])
+    if isinstance(value, dict):
+        return FrozenDict([(freeze_value(k), freeze_value(v))
+                           for k, v in value.iteritems()])
+    if isinstance(value, tuple):
+        return tuple([freeze_value(v) for v in value])
+    return value
+
+
+class FrozenUnimodel(Unimodel):
+    """ Base class for immutable, hashable models. Fields can only be set
+        in the constructor (or by deserializers). Container values are
+        converted to immutable equivalents and nested structs must be
+        frozen too. Both the hash and the result of validate() are
+        computed once and cached. """
+
+    __slots__ = ('_frozen', '_hash', '_validation_error')
+
+    _immutable = True
+    # the hash of strings may differ between processes
+    _transient_slots = ('_value_converter', '_hash')
+
+    @replaceable
+    def __init__(self, *args, **kwargs):
+        super(FrozenUnimodel, self).__init__(*args, **kwargs)
+        self._finish_update()
+
+    @classmethod
+    def _from_model_data(cls, model_data):
+        obj = super(FrozenUnimodel, cls)._from_model_data(model_data)
+        obj._finish_update()
+        return obj
+
+    def _start_update(self):
+        self._frozen = False
+
+    def _finish_update(self):
+        for field_id, value in list(self._iter_values()):
+            frozen_value = freeze_value(value)
+            if frozen_value is not value:
+                super(FrozenUnimodel, self)._set_value_by_field_id(
+                    field_id, frozen_value)
+        self._hash = None
+        self._validation_error = None
+        self._frozen = True
+
+    def _check_not_frozen(self):
+        if getattr(self, '_frozen', False):
+            raise FrozenInstanceError(
+                "Cannot modify frozen %s instance" % self.__class__.__name__)
+
+    def __setattr__(self, name, value):
+        if name in self._fields_by_name or not name.startswith('_'):
+            self._check_not_frozen()
+        super(FrozenUnimodel, self).__setattr__(name, value)
+
+    def __delattr__(self, name):
+        if name in self._fields_by_name or not name.startswith('_'):
+            self._check_not_frozen()
+        super(FrozenUnimodel, self).__delattr__(name)
+
+    def _set_value_by_field_id(self, field_id, value):
+        self._check_not_frozen()
+        super(FrozenUnimodel, self)._set_value_by_field_id(field_id, value)
+
+    def _del_value_by_field_id(self, field_id):
+        self._check_not_frozen()
+        super(FrozenUnimodel, self)._del_value_by_field_id(field_id)
+
+    def _clear_model_data(self):
+        self._check_not_frozen()
+        super(FrozenUnimodel, self)._clear_model_data()
+
+    def __getitem__(self, field_name):
+        # values can not be changed in place, no need to mark them dirty
+        return self._get_value_by_field_id(
+            self._field_name_to_field_id(field_name))
+
+    def read(self, protocol):
+        """ this method is called by the thrift protocols """
+        self._start_update()
+        try:
+            return super(FrozenUnimodel, self).read(protocol)
+        finally:
+            self._finish_update()
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(tuple([
+                self._get_value_by_field_id(field_id)
+                for field_id in self._field_ids]))
+        return self._hash
+
+    def validate(self):
+        if not self._dirty:
+            return
+        if self._validation_error is not None:
+            raise self._validation_error
+        try:
+            super(FrozenUnimodel, self).validate()
+        except ValidationException as ex:
+            self._validation_error = ex
+            raise
+
+
+class CompactUnimodel(Unimodel):
+    """ Base class for models which keep their field values in a fixed
+        size list (one slot per field, in field id order) and have no
+        per-instance __dict__. This saves a lot of memory when holding
+        many instances, but arbitrary attributes can no longer be set
+        on instances. """
+
+    __slots__ = ()
+
+    _field_descriptor_class = CompactFieldDescriptor
+    _lazy_field_descriptor_class = LazyCompactFieldDescriptor
+    _compact_storage = True
+
+    def _new_model_data(self):
+        return [None] * self._field_count
+
+    def _set_value_by_field_id(self, field_id, value):
+        ix = self._field_index[field_id]
+        self._dirty |= 1 << ix
+        self._model_data[ix] = value
+
+    def _get_value_by_field_id(self, field_id):
+        return self._model_data[self._field_index[field_id]]
+
+    def _del_value_by_field_id(self, field_id):
+        ix = self._field_index[field_id]
+        if self._model_data[ix] is None:
+            raise KeyError(field_id)
+        self._dirty |= 1 << ix
+        self._model_data[ix] = None
+
+    def _iter_values(self):
+        field_ids = self._field_ids
+        return ((field_ids[ix], value)
+                for ix, value in enumerate(self._model_data)
+                if value is not None)
+
+    def _clear_model_data(self):
+        self._model_data = self._new_model_data()
+
+
 class UnimodelUnion(Unimodel):
+    """ At most one field of a union is set. The id of the active field
+        is kept in _current_field_id, so finding or replacing it takes
+        constant time regardless of the number of alternatives. Setting
+        a field unsets the previously active one. """
 
-    # TODO: validate that 0 or 1 fields are set!
-    # Perhaps setattr should unset the formerly active field
+    __slots__ = ('_current_field_id',)
+
+    _field_descriptor_class = UnionFieldDescriptor
+    _lazy_field_descriptor_class = LazyUnionFieldDescriptor
+
+    def __init__(self, *args, **kwargs):
+        self._current_field_id = None
+        set_fields = [
+            name for name, value in
+            zip(self._positional_field_names, args) + kwargs.items()
+            if value is not None and name in self._fields_by_name]
+        if len(set_fields) > 1:
+            raise ValueError(
+                "Only one field of union %s can be set, got %s" % (
+                    self.__class__.__name__, ", ".join(sorted(set_fields))))
+        super(UnimodelUnion, self).__init__(*args, **kwargs)
+
+    @classmethod
+    def _from_model_data(cls, model_data):
+        obj = super(UnimodelUnion, cls)._from_model_data(model_data)
+        obj._current_field_id = None
+        set_field_ids = [field_id for field_id in cls._field_ids
+                         if obj._get_value_by_field_id(field_id) is not None]
+        if len(set_field_ids) > 1:
+            raise ValueError(
+                "Only one field of union %s can be set, got %s" % (
+                    cls.__name__, ", ".join(sorted([
+                        cls._fields_by_id[i].field_name
+                        for i in set_field_ids]))))
+        if set_field_ids:
+            obj._current_field_id = set_field_ids[0]
+        return obj
+
+    def _set_value_by_field_id(self, field_id, value):
+        current_field_id = self._current_field_id
+        if value is None:
+            if current_field_id == field_id:
+                self._del_value_by_field_id(field_id)
+            return
+        if current_field_id is not None and current_field_id != field_id:
+            super(UnimodelUnion, self)._del_value_by_field_id(
+                current_field_id)
+        super(UnimodelUnion, self)._set_value_by_field_id(field_id, value)
+        self._current_field_id = field_id
+
+    def _del_value_by_field_id(self, field_id):
+        super(UnimodelUnion, self)._del_value_by_field_id(field_id)
+        if self._current_field_id == field_id:
+            self._current_field_id = None
+
+    def _clear_model_data(self):
+        super(UnimodelUnion, self)._clear_model_data()
+        self._current_field_id = None
+
+    def _iter_values(self):
+        if self._current_field_id is None:
+            return iter([])
+        return iter([(
+            self._current_field_id,
+            self._get_value_by_field_id(self._current_field_id))])
+
+    def items(self):
+        self._dirty |= self._mutable_field_bits
+        if self._current_field_id is None:
+            return iter([])
+        return iter([(self.current_field(), self.current_value())])
+
+    def __repr__(self):
+        L = ['%s=%r' % item for item in self.items()]
+        return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+    def current_field_definition(self):
+        if self._current_field_id is None:
+            return None
+        return self._fields_by_id[self._current_field_id]
 
     def current_field(self):
-        set_fields = []
-        for f in self.get_field_definitions():
-            value = self._get_value_by_field_id(current_field.field_id)
-            if value is not None:
-                set_fields.append(f.field_name, value)
-        if not set_fields:
+        """ Returns the name of the field which is set (or None). """
+        if self._current_field_id is None:
             return None
-        if len(set_fields) > 1:
-            raise Exception(
-                "Union has too many set fields: %s" %
-                str(set_fields))
-        return set_fields[0]
+        return self._fields_by_id[self._current_field_id].field_name
 
     def current_value(self):
-        current_field_name = self.current_field()
-        if not current_field:
+        field_id = self._current_field_id
+        if field_id is None:
             return None
-        return self[current_field_name]
+        value = self._get_value_by_field_id(field_id)
+        if type(value) is LazyValue:
+            value = self._decode_lazy_value(field_id, value)
+        return value
 
     @classmethod
     def is_union(cls):
@@ -286,15 +1215,31 @@ class ModelRegistry(object):
 
     def __init__(self):
         self.class_dict = {}
+        # Incremented by register(), lets users of the registry know
+        # when their cached lookups have gone stale.
+        self.version = 0
+        self._interface_index = None
 
     def register(self, interface_class, implementation_class):
         self.class_dict[interface_class] = implementation_class
+        self.version += 1
+        self._interface_index = None
 
     def lookup(self, interface_class):
         return self.class_dict.get(interface_class, interface_class)
 
     def lookup_interface(self, implementation_class):
+        if self._interface_index is None:
+            self._interface_index = self._build_interface_index()
+        return self._interface_index.get(
+            implementation_class, implementation_class)
+
+    def _build_interface_index(self):
+        # An interface matches every class in the MRO of its
+        # implementation (ie: every class the implementation is a
+        # subclass of). As before, the first registered pair wins.
+        interface_index = {}
         for iface_candidate, impl_candidate in self.class_dict.items():
-            if issubclass(impl_candidate, implementation_class):
-                return iface_candidate
-        return implementation_class
+            for base in impl_candidate.__mro__:
+                interface_index.setdefault(base, iface_candidate)
+        return interface_index
@@ -1,3 +1,7 @@
+import array
+import sys
+import weakref
+from itertools import imap
 from unimodel.validation import (ValidationException, ValueTypeException)
 from unimodel.util import is_str, instantiate_if_class
 
@@ -7,29 +11,40 @@ from unimodel.util import is_str, instantiate_if_class
 
 
 
+# type_id -> FieldType subclass, filled in as the types are defined
+field_type_registry = {}
+
+
+def register_type(type_class):
+    """ Makes type_class the type constructor for its type_id. FieldType
+        subclasses which define a type_id nobody else uses register
+        themselves, so this is only needed to replace a type. """
+    field_type_registry[type_class.type_id] = type_class
+
+
+# canonical instances of field types, see intern_type()
+interned_types = weakref.WeakValueDictionary()
+
+
+def intern_type(field_type):
+    """ Returns the first instance created of the types equal to
+        field_type (which is field_type itself if there is none), so
+        equal types share caches such as the compiled validator. """
+    return interned_types.setdefault(field_type, field_type)
+
+
+def make_type(t):
+    """ Instantiates t if it's a type class, and interns the result. """
+    return intern_type(instantiate_if_class(t))
+
+
 def type_id_to_type_constructor(type_id):
-    import sys
-    import inspect
-    for obj_name in dir(sys.modules[__name__]):
-        obj = getattr(sys.modules[__name__], obj_name)
-        if inspect.isclass(obj) and issubclass(obj, FieldType) and getattr(obj, 'type_id', None) == type_id:
-            return obj
-    return None
+    return field_type_registry.get(type_id, None)
 
 
 def type_id_to_name_dict():
-    import sys
-    import inspect
-    type_dict = {}
-    for type_name in dir(sys.modules[__name__]):
-        t = getattr(sys.modules[__name__], type_name)
-        if inspect.isclass(t) and issubclass(
-                t,
-                FieldType) and hasattr(
-                t,
-                'type_id'):
-            type_dict[t.type_id] = t.__name__.lower()
-    return type_dict
+    return dict([(type_id, t.__name__.lower())
+                 for type_id, t in field_type_registry.iteritems()])
 
 def assert_type(python_type, value):
     if not issubclass(type(value), python_type):
@@ -44,6 +59,41 @@ def assert_type(python_type, value):
             str_value)
         raise ValueTypeException(msg)
 
+
+class LazyValue(object):
+    """ Stands in for a field value which a deserializer read but did not
+        decode. Models holding one replace it with the decoded value
+        when the field is first read, until then serializers can write
+        the raw form back as it is. Only used for types with lazy set. """
+
+    __slots__ = ('raw', 'decode', '_value')
+
+    def __init__(self, raw, decode):
+        self.raw = raw
+        self.decode = decode
+        self._value = self
+
+    def get(self):
+        if self._value is self:
+            self._value = self.decode(self.raw)
+        return self._value
+
+    def __eq__(self, other):
+        if isinstance(other, LazyValue):
+            if self.raw == other.raw:
+                return True
+            other = other.get()
+        return self.get() == other
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    def __repr__(self):
+        return repr(self.get())
+
+    def __reduce__(self):
+        return (LazyValue, (self.raw, self.decode))
+
 # --
 # Field types
 # --
@@ -54,16 +104,83 @@ class StringTypeMarker(object):
 class NumberTypeMarker(object):
     pass
 
+def make_type_check(python_type):
+    """ Returns a function which checks the type of a value. """
+    def check_type(value):
+        if not isinstance(value, python_type):
+            assert_type(python_type, value)
+    return check_type
+
+
+# Collections with at least this many elements have their element types
+# checked in bulk, smaller ones element by element.
+BULK_CHECK_MIN_LENGTH = 32
+
+
+def get_element_types(collection):
+    """ Returns the distinct types of the elements of a collection. """
+    return set(imap(type, collection))
+
+
+def make_bulk_type_check(python_type, value_range=None):
+    """ Returns a function which tells if every element of a collection
+        is a python_type (within value_range if given). """
+    def check(collection):
+        if len(collection) < BULK_CHECK_MIN_LENGTH:
+            for elem in collection:
+                if not isinstance(elem, python_type):
+                    return False
+        else:
+            # each distinct type of element is only checked once
+            for t in get_element_types(collection):
+                if not issubclass(t, python_type):
+                    return False
+        if value_range is not None and collection:
+            low, high = min(collection), max(collection)
+            return value_range[0] <= low and high <= value_range[1]
+        return True
+    return check
+
+
+def chain_validators(check, validators):
+    """ Returns a function which runs check, then each of validators. """
+    if not validators:
+        return check
+    def validate(value):
+        check(value)
+        for validator in validators:
+            validator(value)
+    return validate
+
+class FieldTypeMetaclass(type):
+
+    def __init__(cls, name, bases, attrs):
+        super(FieldTypeMetaclass, cls).__init__(name, bases, attrs)
+        # Subclasses which don't set their own type_id (eg: Array) are
+        # variants of an existing type.
+        if 'type_id' in attrs and attrs['type_id'] not in field_type_registry:
+            register_type(cls)
+
+
 class FieldType(object):
+    __metaclass__ = FieldTypeMetaclass
     # type_id is the unimodel type id, it should be set on child classes
+    # values of mutable types can change without the model noticing
+    mutable = False
+    # fields of lazy types may hold a LazyValue (see FieldFactory)
+    lazy = False
+    # validate functions, see get_validator()
+    _validator = None
+    _compiled_validator = None
+    _hash = None
+
     def __init__(
             self,
             type_parameters=None,
             metadata=None):
         if not type_parameters:
             type_parameters = []
-        type_parameters_fixed = [
-            instantiate_if_class(t) for t in type_parameters]
+        type_parameters_fixed = [make_type(t) for t in type_parameters]
         self.type_parameters = type_parameters_fixed
         self.metadata = metadata
 
@@ -71,16 +188,95 @@ class FieldType(object):
         from unimodel.util import get_backend_type
         return get_backend_type("python", self.type_id)
 
+    # Types are equal if they describe the same values: same class and
+    # type id, equal type parameters, the same metadata object and any
+    # attributes subclasses add to get_structural_key().
+
+    def get_structural_key(self):
+        return (self.__class__, self.type_id,
+                tuple(self.type_parameters), self.metadata)
+
+    def __eq__(self, other):
+        return self is other or (
+            isinstance(other, FieldType) and
+            self.get_structural_key() == other.get_structural_key())
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    def __hash__(self):
+        # types are not modified once created
+        if self._hash is None:
+            self._hash = hash(self.get_structural_key())
+        return self._hash
+
+    def get_type_check(self):
+        """ Returns the python type values are checked against if
+            validating this type is nothing more than a type check,
+            None otherwise. """
+        if self.get_custom_validators() or self.overrides_validate():
+            return None
+        return self.get_python_type()
+
+    def get_value_range(self):
+        """ Returns the (min, max) values of this type if it is bounded
+            (checked in addition to the type check), None otherwise. """
+        return None
+
+    def make_bulk_check(self):
+        """ Returns a function which tells whether all elements of a
+            collection are valid values of this type (but not which one
+            is invalid), or None if they can only be validated one by
+            one. """
+        python_type = self.get_type_check()
+        if python_type is None:
+            return None
+        return make_bulk_type_check(python_type, self.get_value_range())
+
+    def contains_structs(self):
+        """ True if values of this type can hold Unimodel instances. """
+        return any(t.contains_structs() for t in self.type_parameters)
+
+    def get_custom_validators(self):
+        """ Returns the validate methods of the validators in metadata. """
+        if self.metadata and self.metadata.validators:
+            return [v.validate for v in self.metadata.validators]
+        return []
+
     def run_custom_validators(self, value):
         # run custom validators (if any)
-        if self.metadata and self.metadata.validators:
-            for validator in self.metadata.validators:
-                validator.validate(value)
+        for validator in self.get_custom_validators():
+            validator(value)
+
+    def overrides_validate(self):
+        """ True for (third party) types which implement validate()
+            instead of make_validator(). """
+        validate = type(self).validate
+        return getattr(validate, '__func__', validate) is not \
+            FieldType.__dict__['validate']
+
+    def get_validator(self):
+        """ Returns a function equivalent to validate(), built
+            once for this type. """
+        if self._validator is None:
+            if self.overrides_validate():
+                self._validator = self.validate
+            else:
+                self._validator = self.get_compiled_validator()
+        return self._validator
+
+    def get_compiled_validator(self):
+        if self._compiled_validator is None:
+            self._compiled_validator = self.make_validator()
+        return self._compiled_validator
+
+    def make_validator(self):
+        return chain_validators(
+            make_type_check(self.get_python_type()),
+            self.get_custom_validators())
 
     def validate(self, value):
-        # check type of value
-        assert_type(self.get_python_type(), value)
-        self.run_custom_validators(value)
+        self.get_compiled_validator()(value)
 
     def get_type_name(self):
         type_name = self.__class__.__name__
@@ -91,47 +287,104 @@ class FieldType(object):
 
 
 class ParametricType(FieldType):
+    mutable = True
+
+    def get_type_check(self):
+        return None
 
     def validate_elements(self, collection, field_type):
+        validator = field_type.get_validator()
         ix = 0
-        for elem in collection:
-            try:
-                field_type.validate(elem)
-            except ValidationException as ex:
-                msg = ("%(classname)s validation error in element number " +
-                       "%(ix)s (value %(elem)s) %(ex_msg)s") % {
-                    'classname': str(type(self)),
-                    'ix': str(ix),
-                    'elem': str(elem),
-                    'ex_msg': str(ex)}
-                # TODO: maybe try to raise the same exception with a new
-                # message
-                raise ValidationException(msg)
-            ix += 1
-
-    def validate(self, collection):
-        super(ParametricType, self).validate(collection)
-        self.validate_elements(collection, self.type_parameters[0])
-
-
-# TODO: int range validation!
+        try:
+            for elem in collection:
+                validator(elem)
+                ix += 1
+        except ValidationException as ex:
+            msg = ("%(classname)s validation error in element number " +
+                   "%(ix)s (value %(elem)s) %(ex_msg)s") % {
+                'classname': str(type(self)),
+                'ix': str(ix),
+                'elem': str(elem),
+                'ex_msg': str(ex)}
+            # TODO: maybe try to raise the same exception with a new
+            # message
+            raise ValidationException(msg)
+
+    def make_elements_validator(self, field_type):
+        """ Returns a function which validates each element of a
+            collection against field_type, checking all of them at
+            once if field_type supports it. """
+        bulk_check = field_type.make_bulk_check()
+        if bulk_check is None:
+            return lambda collection: self.validate_elements(
+                collection, field_type)
+        validate_elements = self.validate_elements
+        def check_elements(collection):
+            if not bulk_check(collection):
+                # walk the elements to produce the error message
+                validate_elements(collection, field_type)
+        return check_elements
+
+    def make_validator(self):
+        check_collection = super(ParametricType, self).make_validator()
+        check_elements = self.make_elements_validator(self.type_parameters[0])
+        def validate(collection):
+            check_collection(collection)
+            check_elements(collection)
+        return validate
+
+
 class Int64(FieldType, NumberTypeMarker):
     type_id = 1
+    # range of valid values (signed, as in thrift)
+    min_value = -2 ** 63
+    max_value = 2 ** 63 - 1
+
+    def get_value_range(self):
+        # python 2 ints are machine words, if the type check passes
+        # they can't be out of range for 64 bit integers.
+        max_int = getattr(sys, 'maxint', None)
+        if self.get_python_type() is int and max_int is not None and \
+                self.min_value <= -max_int - 1 and max_int <= self.max_value:
+            return None
+        return (self.min_value, self.max_value)
+
+    def make_validator(self):
+        if self.get_value_range() is None:
+            return super(Int64, self).make_validator()
+        python_type = self.get_python_type()
+        min_value = self.min_value
+        max_value = self.max_value
+        type_name = self.__class__.__name__
+        def check_int(value):
+            if not isinstance(value, python_type):
+                assert_type(python_type, value)
+            if not min_value <= value <= max_value:
+                raise ValueTypeException(
+                    "%s is out of range for %s (%s to %s)" %
+                    (value, type_name, min_value, max_value))
+        return chain_validators(check_int, self.get_custom_validators())
 
 Int = Int64  # default is 64 bit integers
 
 
 class Int32(Int):
     type_id = 2
+    min_value = -2 ** 31
+    max_value = 2 ** 31 - 1
 
 # Integers smaller than 32 bits descend from int32 to have
 # the same json_type
 
 class Int16(Int):
     type_id = 3
+    min_value = -2 ** 15
+    max_value = 2 ** 15 - 1
 
 class Int8(Int):
     type_id = 4
+    min_value = -2 ** 7
+    max_value = 2 ** 7 - 1
 
 class Enum(Int):
     type_id = 5
@@ -146,14 +399,34 @@ class Enum(Int):
             if v in self.names_to_keys:
                 raise Exception("Duplicate enum value: %s" % k)
             self.names_to_keys[v] = k
-
-    def validate(self, value):
-        super(Enum, self).validate(value)
-        if not (value in self.keys_to_names.keys()):
-            raise ValueTypeException(
-                "%s is an invalid value for this enum. Valid values: %s" %
-                (value, str(
-                    self.keys_to_names)))
+        self.valid_keys = frozenset(enum_dict)
+
+    def get_structural_key(self):
+        return super(Enum, self).get_structural_key() + (
+            frozenset(self.keys_to_names.items()),)
+
+    def get_type_check(self):
+        return None
+
+    def make_validator(self):
+        check_int = super(Enum, self).make_validator()
+        valid_keys = self.valid_keys
+        keys_to_names = self.keys_to_names
+        def validate(value):
+            check_int(value)
+            if value not in valid_keys:
+                raise ValueTypeException(
+                    "%s is an invalid value for this enum. Valid values: %s" %
+                    (value, str(keys_to_names)))
+        return validate
+
+    def make_bulk_check(self):
+        if self.get_custom_validators():
+            return None
+        check_ints = make_bulk_type_check(self.get_python_type())
+        valid_keys = self.valid_keys
+        return lambda collection: (
+            check_ints(collection) and valid_keys.issuperset(collection))
 
     def name_to_key(self, name):
         return self.names_to_keys[name]
@@ -164,6 +437,16 @@ class Enum(Int):
     def key_to_name(self, key):
         return self.keys_to_names[key]
 
+    def keys_for_names(self, names):
+        """ Returns the list of keys of a sequence of names. """
+        names_to_keys = self.names_to_keys
+        return [names_to_keys[name] for name in names]
+
+    def names_for_keys(self, keys):
+        """ Returns the list of names of a sequence of keys. """
+        keys_to_names = self.keys_to_names
+        return [keys_to_names[key] for key in keys]
+
 
 class Double(FieldType, NumberTypeMarker):
     type_id = 6
@@ -173,20 +456,35 @@ class Bool(FieldType):
 
 class UTF8(FieldType, StringTypeMarker):
     type_id = 8
+    # the thrift serializer keeps the encoded bytes until the field is read
+    lazy = True
 
-    def validate(self, value):
-        # check type of value
-        if not is_str(value):
-            str_value = "<nonprintable value>"
-            try:
-                str_value = str(value)
-            except:
-                pass
-            msg = "Expecting type string, got %s instead (value was %s)" % (
-                str(type(value)),
-                str_value)
-            raise ValueTypeException(msg)
-        self.run_custom_validators(value)
+    def get_type_check(self):
+        # Both UTF8 and Binary accept any kind of string.
+        from unimodel.util import get_backend_type
+        if FieldType.get_type_check(self) is None:
+            return None
+        return get_backend_type("python", UTF8.type_id)
+
+    def make_validator(self):
+        def check_str(value):
+            # check type of value
+            if not is_str(value):
+                str_value = "<nonprintable value>"
+                try:
+                    str_value = str(value)
+                except:
+                    pass
+                msg = "Expecting type string, got %s instead (value was %s)" % (
+                    str(type(value)),
+                    str_value)
+                raise ValueTypeException(msg)
+        check = chain_validators(check_str, self.get_custom_validators())
+        def validate(value):
+            if type(value) is LazyValue:
+                value = value.get()
+            check(value)
+        return validate
 
 
 class Binary(UTF8, StringTypeMarker):
@@ -202,9 +500,22 @@ class Struct(FieldType):
     def get_python_type(self):
         return self.struct_class
 
-    def validate(self, value):
-        assert_type(self.struct_class, value)
-        value.validate()
+    def get_structural_key(self):
+        return super(Struct, self).get_structural_key() + (self.struct_class,)
+
+    def get_type_check(self):
+        return None
+
+    def contains_structs(self):
+        return True
+
+    def make_validator(self):
+        struct_class = self.struct_class
+        def validate(value):
+            if not isinstance(value, struct_class):
+                assert_type(struct_class, value)
+            value.validate()
+        return validate
 
 # Tuples exist because they are defined / used in jsonschema.
 # It is very easy to create non-backwards-compatible protocols
@@ -219,12 +530,22 @@ class Tuple(FieldType):
         if len(type_parameters) == 0:
             raise Exception("Attempting to define empty Tuple")
 
-    def validate(self, value):
-        assert_type(tuple, value)
-        if len(value) != len(self.type_parameters):
-            raise ValueTypeException("Expecting %s length tuple, got %s" % (
-                len(self.type_parameters), len(value)))
-        [assert_type(t.get_python_type(), v) for t, v in zip(self.type_parameters, value)]
+    def get_type_check(self):
+        return None
+
+    def make_validator(self):
+        element_types = [t.get_python_type() for t in self.type_parameters]
+        length = len(element_types)
+        def validate(value):
+            if not isinstance(value, tuple):
+                assert_type(tuple, value)
+            if len(value) != length:
+                raise ValueTypeException("Expecting %s length tuple, got %s" % (
+                    length, len(value)))
+            for python_type, v in zip(element_types, value):
+                if not isinstance(v, python_type):
+                    assert_type(python_type, v)
+        return validate
 
 
 class List(ParametricType):
@@ -232,30 +553,99 @@ class List(ParametricType):
 
     def __init__(self, element_type, *args, **kwargs):
         super(List, self).__init__(*args, **kwargs)
-        self.type_parameters = [instantiate_if_class(element_type)]
+        self.type_parameters = [make_type(element_type)]
 
 
 class Set(List):
     type_id = 13
 
+
+# element type id -> array.array type code of Array values
+ARRAY_TYPECODES = {
+    Int8.type_id: 'b',
+    Int16.type_id: 'h',
+    Int32.type_id: 'i',
+    Int64.type_id: 'l' if array.array('l').itemsize == 8 else 'q',
+    Double.type_id: 'd'}
+
+
+class Array(List):
+    """ A list of numbers held in an array.array (or a numpy array if
+        use_numpy is set and numpy is installed) instead of a list.
+        Backends encode it exactly like a List of the same element
+        type, but handle the elements in bulk. """
+
+    def __init__(self, element_type, use_numpy=False, **kwargs):
+        super(Array, self).__init__(element_type, **kwargs)
+        self.typecode = ARRAY_TYPECODES.get(
+            self.type_parameters[0].type_id, None)
+        if self.typecode is None or isinstance(self.type_parameters[0], Enum):
+            raise Exception(
+                "Array elements must be Int8, Int16, Int32, Int64 or Double")
+        self.use_numpy = False
+        if use_numpy:
+            try:
+                import numpy
+                self.use_numpy = True
+            except ImportError:
+                pass
+
+    def get_python_type(self):
+        return array.array
+
+    def get_structural_key(self):
+        return super(Array, self).get_structural_key() + (self.use_numpy,)
+
+    def make_array(self, values=()):
+        """ Returns a new array of the kind this type holds. """
+        if self.use_numpy:
+            import numpy
+            return numpy.array(values, dtype=self.typecode)
+        return array.array(self.typecode, values)
+
+    def make_validator(self):
+        typecode = self.typecode
+        # numpy arrays are checked by the kind and size of their elements
+        dtype_kind = 'f' if typecode == 'd' else 'i'
+        itemsize = array.array(typecode).itemsize
+        def check_array(value):
+            if isinstance(value, array.array):
+                if value.typecode == typecode:
+                    return
+            else:
+                dtype = getattr(value, 'dtype', None)
+                if dtype is not None and dtype.kind == dtype_kind and \
+                        dtype.itemsize == itemsize:
+                    return
+            raise ValueTypeException(
+                "Expecting array with type code '%s', got %s" %
+                (typecode, type(value)))
+        validators = self.get_custom_validators()
+        # the type code guarantees the type and range of the elements
+        if self.type_parameters[0].get_custom_validators():
+            validators.append(
+                self.make_elements_validator(self.type_parameters[0]))
+        return chain_validators(check_array, validators)
+
 class Map(ParametricType):
     type_id = 14
 
     def __init__(self, key_type, value_type, *args, **kwargs):
         super(Map, self).__init__(*args, **kwargs)
-        self.type_parameters = [
-            instantiate_if_class(key_type),
-            instantiate_if_class(value_type)]
+        self.type_parameters = [make_type(key_type), make_type(value_type)]
 
-    def validate(self, dictionary):
+    def make_validator(self):
         # First run validators on the container type itself.
-        super(Map, self).validate(dictionary)
-        # Validate the elements of the container.
-        if dictionary:
-            self.validate_elements(dictionary.keys(), self.type_parameters[0])
-            self.validate_elements(
-                dictionary.values(),
-                self.type_parameters[1])
+        check_dict = FieldType.make_validator(self)
+        # Then validate the keys and values of the container.
+        check_keys = self.make_elements_validator(self.type_parameters[0])
+        check_values = self.make_elements_validator(self.type_parameters[1])
+        def validate(dictionary):
+            check_dict(dictionary)
+            if dictionary:
+                check_keys(dictionary)
+                check_values(dictionary.values())
+        return validate
 
 class BigInt(FieldType, NumberTypeMarker):
     type_id = 15
@@ -268,6 +658,8 @@ class BigInt(FieldType, NumberTypeMarker):
 
 class JSONData(FieldType):
     type_id = 16
+    # the thrift serializer keeps the JSON text until the field is read
+    lazy = True
 
     def to_string(self, value):
         import json
@@ -277,10 +669,13 @@ class JSONData(FieldType):
         import json
         return json.loads(string)
 
-    def validate(self, dictionary):
+    def get_type_check(self):
+        return object
+
+    def make_validator(self):
         # we could theoretically walk the
         # json data to make sure only
         # json-serializable (non class instance)
         # values are within
-        pass
+        return lambda value: None
 
@@ -18,6 +18,15 @@ def instantiate_if_class(t):
         return t()
     return t
 
+def compile_function(source, function_name, namespace=None, filename=None):
+    """ Compiles the python source of a single function definition and
+        returns the function. namespace holds the globals the generated
+        code can refer to. """
+    namespace = dict(namespace or {})
+    code = compile(source, filename or "<unimodel:%s>" % function_name, "exec")
+    exec(code, namespace)
+    return namespace[function_name]
+
 def get_full_classname(cls):
     return "%s.%s" % (cls.__module__, cls.__name__)
 